@@ -0,0 +1,115 @@
+"""
+crawls the local mock Moodle from mock_moodle end to end with Kraken.run and reports throughput, peak memory
+and wall time for every combination of thread count and parser backend
+
+    python benchmarks/bench_crawl.py [--threads 4 12 24] [--parsers html.parser lxml] [--courses 40]
+
+every crawl runs in its own process with a fresh download directory, so peak RSS and wall time
+belong to that crawl alone, the mock server runs in this process
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bs4.builder import builder_registry
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_moodle import MockMoodle  # noqa: E402
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    # linux reports kilobytes, macos bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def crawl(config_path, result_path):
+    """runs in the child process: one crawl with the given config, the results are written to result_path"""
+    sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+    import kraken
+
+    kraken.logger.setLevel("WARNING")
+    config = kraken.Config(config_path)
+    crawler = kraken.AsyncKraken(config) if config.ENGINE == "asyncio" else kraken.Kraken(config)
+    start = time.perf_counter()
+    crawler.run()
+    seconds = time.perf_counter() - start
+    counters = crawler.metrics.snapshot()["counters"]
+    with open(result_path, "w") as f:
+        json.dump({"seconds": seconds, "pages": counters.get("pages", 0), "retries": counters.get("retries", 0),
+                   "bytes": counters.get("bytes_downloaded", 0), "files": len(crawler.downloads),
+                   "peak_rss_mb": peak_rss_mb()}, f)
+
+
+def run_crawl(moodle, threads, parser_name, engine, parse_processes=0, folder_mode="zip"):
+    with tempfile.TemporaryDirectory(prefix="kraken-bench-") as work_dir:
+        credentials = os.path.join(work_dir, "credentials.env")
+        with open(credentials, "w") as f:
+            f.write("STUDENT_USER=bench\nSTUDENT_PASSWORD=bench\n")
+        config_path = os.path.join(work_dir, "config.json")
+        with open(config_path, "w") as f:
+            json.dump({"baseURL": moodle.course_list_url, "saveDirectory": os.path.join(work_dir, "downloads"),
+                       "credentials": credentials, "filter_courses": [], "threadCount": threads,
+                       "parser": parser_name, "engine": engine, "checkpointInterval": 0, "progressInterval": 0,
+                       "maxFileSizeInMB": 1000, "parseProcesses": parse_processes, "folderMode": folder_mode}, f)
+        result_path = os.path.join(work_dir, "result.json")
+        # the child runs in the work directory, so its kraken.log ends up there as well
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--crawl", config_path, result_path],
+                       cwd=work_dir, check=True, stdout=subprocess.DEVNULL)
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 12, 24])
+    parser.add_argument("--parsers", nargs="+", default=["html.parser", "lxml"])
+    parser.add_argument("--engine", default="threads", choices=["threads", "asyncio"])
+    parser.add_argument("--parse-processes", type=int, default=0, help="parse pages in this many processes")
+    parser.add_argument("--folder-mode", default="zip", choices=["zip", "extract", "files"])
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--file-kb", type=int, default=256)
+    parser.add_argument("--large-file-mb", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=20, help="server latency added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses that are a 503")
+    parser.add_argument("--max-in-flight", type=int, default=0,
+                        help="concurrent requests before the server answers 429")
+    parser.add_argument("--session-ttl", type=float, default=0, help="seconds until the login session expires")
+    parser.add_argument("--crawl", nargs=2, metavar=("CONFIG", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.crawl:
+        crawl(*args.crawl)
+        return
+
+    with MockMoodle(courses=args.courses, file_kb=args.file_kb, large_file_mb=args.large_file_mb,
+                    latency_ms=args.latency_ms, error_rate=args.error_rate,
+                    max_in_flight=args.max_in_flight, session_ttl=args.session_ttl) as moodle:
+        print(f"mock moodle at {moodle.base_url}, {args.courses} courses, {args.latency_ms} ms latency")
+        print(f"{'threads':>7}  {'parser':<12}{'wall s':>8}{'pages':>7}{'pages/s':>9}{'files':>7}"
+              f"{'MB':>8}{'MB/s':>8}{'retries':>9}{'peak RSS MB':>13}")
+        for parser_name in args.parsers:
+            if builder_registry.lookup(parser_name) is None:
+                print(f"{'':>7}  {parser_name:<12}not installed")
+                continue
+            for threads in args.threads:
+                result = run_crawl(moodle, threads, parser_name, args.engine, args.parse_processes, args.folder_mode)
+                megabytes = result["bytes"] / 1000 ** 2
+                print(f"{threads:>7}  {parser_name:<12}{result['seconds']:>8.2f}{result['pages']:>7}"
+                      f"{result['pages'] / result['seconds']:>9.1f}{result['files']:>7}{megabytes:>8.1f}"
+                      f"{megabytes / result['seconds']:>8.1f}{result['retries']:>9}{result['peak_rss_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+compares parse time and memory of the parser backends for course and file pages, with full and partial parsing
+
+    python benchmarks/bench_parsers.py [--repeat 20] [--pages saved_page.html ...]
+
+without --pages synthetic pages from moodle_pages are used, saved pages are treated as course pages
+if their name contains "course" and as file pages otherwise
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import moodle_pages  # noqa: E402
+from kraken import COURSEPAGE_STRAINER, FILEPAGE_STRAINER, extract_coursepage_targets, extract_filepage  # noqa: E402
+
+PARSERS = ["html.parser", "lxml", "html5lib"]
+
+
+def load_pages(paths):
+    if not paths:
+        return [("course", "https://example.org/course/view.php?id=1",
+                 moodle_pages.course_page(1, base_url="https://example.org")),
+                ("file", "https://example.org/mod/resource/view.php?id=1",
+                 moodle_pages.resource_page(1, "https://example.org/pluginfile.php/1/mod_resource/content/1/v1.pdf"))]
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            kind = "course" if "course" in os.path.basename(path) else "file"
+            pages.append((kind, "https://example.org/" + os.path.basename(path), f.read()))
+    return pages
+
+
+def measure(kind, url, html, parser, partial, repeat):
+    strainer = (COURSEPAGE_STRAINER if kind == "course" else FILEPAGE_STRAINER) if partial else None
+    extract = extract_coursepage_targets if kind == "course" else extract_filepage
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(BeautifulSoup(html, parser, parse_only=strainer), url)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    soup = BeautifulSoup(html, parser, parse_only=strainer)
+    extract(soup, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pages", nargs="*", default=[])
+    args = parser.parse_args()
+
+    print(f"{'page':<8}{'kb':>7}  {'parser':<12}{'mode':<9}{'ms/page':>9}{'peak kb':>10}")
+    for kind, url, html in load_pages(args.pages):
+        for parser_name in PARSERS:
+            if builder_registry.lookup(parser_name) is None:
+                print(f"{kind:<8}{len(html) // 1024:>7}  {parser_name:<12}not installed")
+                continue
+            # html5lib ignores parse_only, so only the full parse is meaningful
+            modes = [False] if parser_name == "html5lib" else [False, True]
+            for partial in modes:
+                seconds, peak = measure(kind, url, html, parser_name, partial, args.repeat)
+                print(f"{kind:<8}{len(html) // 1024:>7}  {parser_name:<12}{'partial' if partial else 'full':<9}"
+                      f"{seconds * 1000:>9.2f}{peak // 1024:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+local stand-in for elearning.fhws.de, serves a synthetic Moodle with the pages from moodle_pages:
+login form with logintoken, paginated get_courses_ajax, course pages, resource / folder / url pages,
+303 redirects of forced downloads, files of configurable size, large ones included, and folder zips
+streamed like download_folder.php does, with data descriptors and without Content-Length
+
+    python benchmarks/mock_moodle.py [--port 8000] [--courses 40]
+
+and point baseURL of the kraken config to the printed URL, any user name and password are accepted
+"""
+import argparse
+import hashlib
+import json
+import mimetypes
+import random
+import re
+import threading
+import time
+import zipfile
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import moodle_pages
+
+SESSION_COOKIE = "MoodleSession"
+LOGIN_TOKEN = "mocktoken"
+FILE_TYPES = ["pdf", "pdf", "pdf", "pptx", "docx", "zip", "py", "mp4"]
+BLOCK_SIZE = 64 * 1024
+# all files are dated to the start of the server, so conditional requests of a second run answer 304
+STARTED = int(time.time())
+LAST_MODIFIED = formatdate(STARTED, usegmt=True)
+FOLDER_FILES = 3
+
+
+class MockMoodle:
+    """
+    threaded http server with a synthetic Moodle, the content only depends on the parameters,
+    so every run of a benchmark crawls the same pages and files
+    :param courses: number of courses in the course list
+    :param per_page: courses per page of the ajax course list
+    :param sections: sections (li.section blocks) per course
+    :param links_per_section: module links per section, resource / folder / url links are crawled
+    :param file_kb: size of regular files
+    :param large_file_mb: size of every large_every-th file, 0 disables large files
+    :param latency_ms: added to every response to simulate a busy server
+    :param error_rate: share of requests answered with 503, to exercise retries
+    :param session_ttl: seconds after which a login session expires and requests are sent to the login page,
+        0 keeps sessions forever
+    :param max_in_flight: requests above this many at the same time are answered with 429 and Retry-After,
+        0 serves any number of them
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, courses=40, per_page=12, sections=6, links_per_section=10,
+                 file_kb=256, large_file_mb=20, large_every=50, latency_ms=0, error_rate=0.0, max_in_flight=0,
+                 session_ttl=0):
+        self.courses = courses
+        self.per_page = per_page
+        self.sections = sections
+        self.links_per_section = links_per_section
+        self.file_kb = file_kb
+        self.large_file_mb = large_file_mb
+        self.large_every = large_every
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.throttled = 0
+        self.session_ttl = session_ttl
+        # session id to the time of its login
+        self.sessions = {}
+        self.logins = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.server.daemon_threads = True
+        # clients that give up on a throttled connection are expected, not worth a traceback
+        self.server.handle_error = lambda request, client_address: None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def course_list_url(self):
+        return self.base_url + "/course/index.php?mycourses=1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-moodle", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def file_size(self, file_id):
+        if self.large_file_mb and file_id % self.large_every == 0:
+            return self.large_file_mb * 1000 ** 2
+        return self.file_kb * 1024
+
+    def file_url(self, module_id):
+        file_type = FILE_TYPES[module_id % len(FILE_TYPES)]
+        return f"{self.base_url}/pluginfile.php/{module_id}/mod_resource/content/1/Skript_{module_id}.{file_type}"
+
+    def folder_file_url(self, module_id, index):
+        return f"{self.base_url}/pluginfile.php/{module_id * 10 + index}/mod_folder/content/0/Blatt_{index}.pdf"
+
+    def file_chunks(self, file_id):
+        block = _file_block(file_id)
+        remaining = self.file_size(file_id)
+        while remaining > 0:
+            yield block[:remaining]
+            remaining -= len(block)
+
+    def course_list(self, index):
+        first = index * self.per_page
+        ids = range(first + 1, min(first + self.per_page, self.courses) + 1)
+        pages = (self.courses + self.per_page - 1) // self.per_page
+        pagination = "".join(f'<a class="page-link" href="#" data-page="{page}">?page={page}</a>'
+                             for page in range(pages))
+        return {"courses": [{"coursename": f'<a href="{self.base_url}/course/view.php?id={course_id}">'
+                                           f'Kurs {course_id}</a>',
+                             "courseurl": f"{self.base_url}/course/view.php?id={course_id}"} for course_id in ids],
+                "pagination": pagination}
+
+
+def _file_block(file_id):
+    seed = hashlib.sha256(str(file_id).encode()).digest()
+    return seed * (BLOCK_SIZE // len(seed))
+
+
+def _handler_for(moodle):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self._handle()
+
+        def do_POST(self):
+            self._handle()
+
+        def _handle(self):
+            with moodle.lock:
+                moodle.requests += 1
+                moodle.in_flight += 1
+                throttled = moodle.max_in_flight and moodle.in_flight > moodle.max_in_flight
+                if throttled:
+                    moodle.throttled += 1
+            try:
+                failed = not throttled and random.random() < moodle.error_rate
+                if throttled or failed:
+                    # read the body of a rejected post, it would be taken for the next request on the connection
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if throttled:
+                    return self._send(429, b"too many requests", "text/plain", {"Retry-After": "1"})
+                if failed:
+                    return self._send(503, b"service unavailable", "text/plain")
+                self._serve()
+            finally:
+                with moodle.lock:
+                    moodle.in_flight -= 1
+
+        def _serve(self):
+            if moodle.latency_ms:
+                time.sleep(moodle.latency_ms / 1000)
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            path = url.path
+
+            if path == "/login/index.php":
+                return self._login()
+            if not self._logged_in():
+                return self._redirect(moodle.base_url + "/login/index.php")
+            if path == "/course/index.php":
+                return self._html("<html><body><h1>Meine Kurse</h1></body></html>")
+            if path == "/theme/remui/request_handler.php":
+                index = int(re.search(r'"mycourses":"[\s+]*(\d+)', unquote(url.query)).group(1))
+                # remui sends json as text/html
+                return self._send(200, json.dumps(moodle.course_list(index)).encode(), "text/html; charset=utf-8")
+            if path == "/course/view.php":
+                course_id = int(query["id"][0])
+                return self._html(moodle_pages.course_page(course_id, base_url=moodle.base_url,
+                                                           sections=moodle.sections,
+                                                           links_per_section=moodle.links_per_section))
+            if path == "/mod/folder/download_folder.php":
+                return self._folder_zip(int(query["id"][0]))
+            if path.startswith("/pluginfile.php/"):
+                return self._file(int(path.split("/")[2]), path.rsplit("/", 1)[-1])
+
+            match = re.match(r"/mod/(\w+)/view\.php", path)
+            if match is None:
+                return self._send(404, b"not found", "text/plain")
+            module, module_id = match.group(1), int(query["id"][0])
+            if module == "resource":
+                if module_id % 5 == 0:
+                    # forced downloads redirect straight to the file
+                    return self._redirect(moodle.file_url(module_id))
+                return self._html(moodle_pages.resource_page(module_id, moodle.file_url(module_id)))
+            if module == "folder":
+                files = [moodle.folder_file_url(module_id, index) for index in range(FOLDER_FILES)]
+                download_url = moodle.base_url + "/mod/folder/download_folder.php"
+                return self._html(moodle_pages.folder_page(module_id, download_url, files))
+            if module == "url":
+                target = moodle.file_url(module_id) if module_id % 2 else f"https://example.org/{module_id}"
+                return self._html(moodle_pages.url_page(module_id, target))
+            return self._html(f"<html><body><h1>{module} {module_id}</h1></body></html>")
+
+        def _logged_in(self):
+            cookies = self.headers.get("Cookie", "")
+            match = re.search(SESSION_COOKIE + r"=(\w+)", cookies)
+            if match is None or match.group(1) not in moodle.sessions:
+                return False
+            return not moodle.session_ttl or time.monotonic() - moodle.sessions[match.group(1)] < moodle.session_ttl
+
+        def _login(self):
+            if self.command == "GET":
+                return self._html(f'<html><body><form id="login" method="post" action="{moodle.base_url}'
+                                  f'/login/index.php"><input type="hidden" name="logintoken" value="{LOGIN_TOKEN}">'
+                                  f'<input name="username"><input name="password" type="password"></form>'
+                                  f'</body></html>')
+            form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+            if form.get("logintoken") != [LOGIN_TOKEN]:
+                return self._redirect(moodle.base_url + "/login/index.php")
+            session = hashlib.sha256(str(time.time_ns()).encode()).hexdigest()[:26]
+            with moodle.lock:
+                moodle.sessions[session] = time.monotonic()
+                moodle.logins += 1
+            return self._redirect(moodle.course_list_url, {"Set-Cookie": f"{SESSION_COOKIE}={session}; Path=/"})
+
+        def _file(self, file_id, file_name):
+            etag = f'"{file_id}-{moodle.file_size(file_id)}"'
+            if self.headers.get("If-None-Match") == etag or self._not_modified_since():
+                return self._send(304, b"", None, {"ETag": etag})
+            self.send_response(200)
+            self.send_header("Content-Type", mimetypes.guess_type(file_name)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(moodle.file_size(file_id)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            self.end_headers()
+            for chunk in moodle.file_chunks(file_id):
+                self.wfile.write(chunk)
+
+        def _not_modified_since(self):
+            since = self.headers.get("If-Modified-Since")
+            try:
+                return since is not None and parsedate_to_datetime(since).timestamp() >= STARTED
+            except (TypeError, ValueError):
+                return False
+
+        def _folder_zip(self, module_id):
+            # the members are written straight to the socket, so the zip has data descriptors and
+            # the connection is closed to end the response
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", f'attachment; filename="Ordner {module_id}.zip"')
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            with zipfile.ZipFile(self.wfile, "w", zipfile.ZIP_DEFLATED) as archive:
+                for index in range(FOLDER_FILES):
+                    with archive.open(f"Blatt_{index}.pdf", "w") as member:
+                        for chunk in moodle.file_chunks(module_id * 10 + index):
+                            member.write(chunk)
+
+        def _html(self, html):
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+        def _redirect(self, location, headers=None):
+            self._send(303, b"", None, {"Location": location, **(headers or {})})
+
+        def _send(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header("Content-Type", content_type)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--file-kb", type=int, default=256)
+    parser.add_argument("--large-file-mb", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-in-flight", type=int, default=0)
+    parser.add_argument("--session-ttl", type=float, default=0)
+    args = parser.parse_args()
+
+    moodle = MockMoodle(port=args.port, courses=args.courses, file_kb=args.file_kb,
+                        large_file_mb=args.large_file_mb, latency_ms=args.latency_ms,
+                        error_rate=args.error_rate, max_in_flight=args.max_in_flight, session_ttl=args.session_ttl)
+    print(f"serving a mock moodle at {moodle.course_list_url}")
+    try:
+        moodle.server.serve_forever()
+    except KeyboardInterrupt:
+        moodle.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+synthetic Moodle (remui theme) pages for benchmarks, shaped like the pages of elearning.fhws.de:
+lots of theme chrome around the few elements the crawler actually reads
+"""
+import random
+
+MODULE_TYPES = ["resource", "resource", "resource", "folder", "url", "forum", "assign", "quiz", "page"]
+
+
+def _chrome(seed, size):
+    rnd = random.Random(seed)
+    menu = "".join(f'<li class="nav-item"><a class="nav-link" href="/course/view.php?id={rnd.randint(1, 99999)}">'
+                   f'<i class="fa fa-book"></i><span>Kurs {i}</span></a></li>' for i in range(size))
+    scripts = "".join(f'<script>M.util.js_pending("core/{i}"); require(["jquery"], function($) {{ '
+                      f'$("#nav-{i}").on("click", function() {{ return {i}; }}); }});</script>' for i in range(size))
+    svg = '<svg width="24" height="24"><path d="' + " ".join(f"M{i} {i} L{i + 5} {i + 3}" for i in range(50)) + '"/></svg>'
+    return (f'<nav class="navbar fixed-top"><ul class="navbar-nav">{menu}</ul>{svg}</nav>'
+            f'<div id="nav-drawer" class="drawer"><ul class="list-group">{menu}</ul></div>', scripts)
+
+
+def _page(title, content, seed, chrome_size):
+    header, scripts = _chrome(seed, chrome_size)
+    return (f'<!DOCTYPE html><html lang="de"><head><title>{title}</title>'
+            f'<link rel="stylesheet" href="/theme/styles.php/remui/1/all"></head>'
+            f'<body id="page-course-view" class="format-topics">{header}'
+            f'<div id="page" class="container-fluid"><div id="page-header"><h1>{title}</h1></div>'
+            f'<div id="region-main">{content}</div></div>'
+            f'<footer id="page-footer"><div class="footer-content">Impressum | Datenschutz</div></footer>'
+            f'{scripts}</body></html>')
+
+
+def course_page(course_id, base_url="", sections=12, links_per_section=15, chrome_size=80):
+    """a course page with topic sections (li.section) full of module links"""
+    rnd = random.Random(course_id)
+    blocks = []
+    for section in range(sections):
+        links = []
+        for link in range(links_per_section):
+            module = rnd.choice(MODULE_TYPES)
+            module_id = course_id * 1000 + section * 100 + link
+            links.append(f'<li class="activity {module} modtype_{module}"><div class="activityinstance">'
+                         f'<a onclick="" href="{base_url}/mod/{module}/view.php?id={module_id}">'
+                         f'<img src="/theme/image.php/remui/{module}/1/icon" class="iconlarge activityicon">'
+                         f'<span class="instancename">{module.title()} {section}.{link}'
+                         f'<span class="accesshide"> Datei</span></span></a></div></li>')
+        blocks.append(f'<li id="section-{section}" class="section main clearfix" role="region">'
+                      f'<div class="content"><h4 class="sectionname"><a href="#section-{section}">'
+                      f'Woche {section}</a></h4><ul class="section img-text">{"".join(links)}</ul></div></li>')
+    content = f'<div class="course-content"><ul class="topics">{"".join(blocks)}</ul></div>'
+    return _page(f"Kurs {course_id}", content, course_id, chrome_size)
+
+
+def resource_page(module_id, file_url, chrome_size=80):
+    """a mod/resource/view.php page that links the file through the resourceworkaround"""
+    file_name = file_url.rsplit("/", 1)[-1]
+    content = (f'<h2>Ressource {module_id}</h2><div class="resourceworkaround">Klicken Sie auf '
+               f'<a onclick="this.target=\'_blank\'" href="{file_url}">{file_name}</a>, um die Datei anzuzeigen.</div>')
+    return _page(f"Ressource {module_id}", content, module_id, chrome_size)
+
+
+def folder_page(module_id, download_url, files=(), chrome_size=80):
+    """a mod/folder/view.php page with the file tree and the download folder form"""
+    tree = "".join(f'<li><span class="fp-filename-icon"><a href="{url}"><span class="fp-filename">'
+                   f'{url.rsplit("/", 1)[-1]}</span></a></span></li>' for url in files)
+    content = (f'<h2>Ordner {module_id}</h2><div class="box generalbox foldertree"><ul>{tree}</ul></div>'
+               f'<div class="singlebutton"><form method="post" action="{download_url}">'
+               f'<input type="hidden" name="id" value="{module_id}"><button type="submit">Ordner herunterladen'
+               f'</button></form></div>')
+    return _page(f"Ordner {module_id}", content, module_id, chrome_size)
+
+
+def url_page(module_id, target_url, chrome_size=80):
+    """a mod/url/view.php page that links an external URL"""
+    content = (f'<h2>Link {module_id}</h2><div class="urlworkaround">Klicken Sie auf '
+               f'<a onclick="" href="{target_url}">{target_url}</a>, um den Link zu öffnen.</div>')
+    return _page(f"Link {module_id}", content, module_id, chrome_size)
@@ -1,22 +1,67 @@
+import argparse
+import asyncio
+import copy
+import errno
+import fnmatch
+import hashlib
 import json
+import multiprocessing
 import logging
+import mimetypes
 import os
+import random
 import re
+import shutil
+import socket
+import struct
 import sys
+import threading
+import time
 import unicodedata
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue, Empty
-from urllib.parse import urlparse, unquote, urlsplit
+import zipfile
+import zlib
+from collections import OrderedDict, deque, namedtuple
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from email.utils import formatdate, parsedate_to_datetime
+from queue import Queue, Empty, Full
+from urllib.parse import urlparse, unquote, urlsplit, urlunsplit, parse_qs, parse_qsl, urlencode
 
 import requests
-from bs4 import BeautifulSoup, NavigableString
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
+from bs4.builder import builder_registry
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 
+try:
+    import psutil
+except ImportError:  # only needed to recycle webdrivers by memory usage
+    psutil = None
+
+try:
+    import aiohttp
+except ImportError:  # only needed for the asyncio engine
+    aiohttp = None
+
 STANDARD_LOG_FORMAT = "[%(levelname)s][%(asctime)s]: %(message)s"
 STANDARD_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# resources the headless browser does not need to render the page content
+BLOCKED_BROWSER_RESOURCES = ["*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+                             "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico"]
+# query parameters that do not change the requested resource
+IGNORED_QUERY_PARAMS = {"forcedownload", "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content"}
+# parser backends that build the whole page anyway and warn about a parse_only strainer
+PARSERS_WITHOUT_PARSE_ONLY = {"html5lib"}
+# moodle sends requests of an expired session to the login page
+LOGIN_PATH = "/login/index.php"
+LOGIN_FORM_MARKER = b'name="logintoken"'
+# seconds between two looks of a coordinator or an idle worker node at the shard queue
+SHARD_POLL_INTERVAL = 10
 
 logging.basicConfig(level=logging.ERROR,
                     format=STANDARD_LOG_FORMAT, datefmt=STANDARD_LOG_DATE_FORMAT,
@@ -29,6 +74,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+@lru_cache(maxsize=4096)
 def slugify(value, allow_unicode=True):
     """
     Taken from https://github.com/django/django/blob/master/django/utils/text.py
@@ -49,10 +95,413 @@ def slugify(value, allow_unicode=True):
     return re.sub(r'[-\s]+', '_', value).strip('-_')
 
 
+def canonicalize_url(url):
+    """
+    normalizes an URL so that different spellings of the same resource compare equal
+    drops the fragment and parameters from IGNORED_QUERY_PARAMS, sorts the query and lowercases scheme and host
+    """
+    parts = urlsplit(url.strip())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in IGNORED_QUERY_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def get_course_id(course_url):
+    """:return: the id parameter of a course URL, the URL itself if it has none"""
+    return parse_qs(urlsplit(course_url).query).get("id", [course_url])[0]
+
+
+def split_courses(courses, shard_count, explicit_shards=()):
+    """
+    splits the course list of a crawl into shards
+    :param courses: the course URLs
+    :param shard_count: number of shards the courses are distributed to by a hash of their id
+    :param explicit_shards: lists of course ids that form a shard of their own, e.g. a few very large courses
+    :return: list of non empty lists of course URLs
+    """
+    explicit_ids = {str(course_id): index for index, shard in enumerate(explicit_shards) for course_id in shard}
+    shards = [[] for _ in range(len(explicit_shards) + shard_count)]
+    for course in courses:
+        course_id = get_course_id(course)
+        if course_id in explicit_ids:
+            shards[explicit_ids[course_id]].append(course)
+        else:
+            # crc32 instead of hash(), which differs between processes
+            shards[len(explicit_shards) + zlib.crc32(course_id.encode()) % shard_count].append(course)
+    return [shard for shard in shards if shard]
+
+
+def is_login_url(url):
+    """:return: true if the URL is the moodle login page, e.g. the target of a redirect of an expired session"""
+    return bool(url) and urlsplit(url).path.endswith(LOGIN_PATH)
+
+
+def get_file_type_from_url(url):
+    """:return: the lowercase extension of the URL path without the dot, empty for pages like view.php"""
+    extension = os.path.splitext(unquote(urlparse(url).path))[-1].lstrip(".").lower()
+    return "" if extension.startswith("php") else extension
+
+
+def get_file_type_from_headers(headers):
+    """
+    determines the file type of a response from its Content-Disposition file name or else its Content-Type
+    :param headers: the response headers
+    :return: the lowercase extension without the dot, empty if unknown
+    """
+    disposition = headers.get("Content-Disposition", "")
+    match = re.search(r"filename\*?=(?:[\w-]+'[\w-]*')?\"?([^\";]+)", disposition)
+    if match:
+        return os.path.splitext(unquote(match.group(1)))[-1].lstrip(".").lower()
+    content_type = headers.get("Content-Type", "").split(";")[0].strip()
+    extension = mimetypes.guess_extension(content_type) if content_type else None
+    return extension.lstrip(".").lower() if extension else ""
+
+
+def get_folder_member_path(folder_dir, member_path):
+    """
+    maps the path of a file inside a moodle folder, from its zip or its folder listing, to a path in folder_dir
+    absolute paths and ".." are dropped, so a member can never be written outside of folder_dir
+    :return: the path on disk, None if member_path names no file
+    """
+    parts = [part for part in member_path.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    if not parts or member_path.endswith("/"):
+        return None
+    return os.path.join(folder_dir, *parts)
+
+
+FilterDecision = namedtuple("FilterDecision", ["accepted", "rule"])
+
+
+class CourseFilter:
+    """
+    include/exclude conditions of Config.FILTER_COURSES, compiled once into a single pattern that tells for
+    every condition whether it matches a course name in one pass
+    the "mode" of a condition is "literal" (default, substring), "glob" (whole name with * and ?) or "regex"
+    a name is accepted if it matches all include conditions and no exclude condition
+    """
+
+    def __init__(self, conditions):
+        self.rules = list(conditions)
+        parts = []
+        # standalone pattern per condition, used if the conditions do not combine into one pattern
+        self.patterns = []
+        for index, rule in enumerate(self.rules):
+            mode = rule.get("mode", "literal")
+            pattern = rule["condition_string"]
+            if mode == "literal":
+                body = re.escape(pattern)
+                parts.append(f"(?=.*?(?P<r{index}>{body}))")
+            elif mode == "glob":
+                body = fnmatch.translate(pattern)
+                parts.append(f"(?=(?P<r{index}>{body}))")
+            elif mode == "regex":
+                body = pattern
+                parts.append(f"(?=.*?(?P<r{index}>{body}))")
+            else:
+                raise ValueError(f"unknown mode {mode!r} in course filter {pattern!r}")
+            try:
+                self.patterns.append(re.compile(body, re.DOTALL))
+            except re.error as e:
+                raise ValueError(f"invalid regex in course filter {pattern!r}: {e}")
+        try:
+            # every lookahead is optional, the named group tells if its condition matched
+            self.matcher = re.compile("".join(f"(?:{part})?" for part in parts), re.DOTALL)
+        except re.error:
+            # e.g. regex conditions with backreferences or inline global flags, match them one by one
+            logger.debug("course filter conditions do not combine, matching them one by one")
+            self.matcher = None
+
+    def _matching_rules(self, name):
+        if self.matcher is not None:
+            match = self.matcher.match(name)
+            return {index for index in range(len(self.rules)) if match.group(f"r{index}") is not None}
+        return {index for index, pattern in enumerate(self.patterns)
+                if (pattern.match(name) if self.rules[index].get("mode") == "glob" else pattern.search(name))}
+
+    def decide(self, name):
+        """:return: FilterDecision with the rule that rejected the name or the first include rule it matched"""
+        matching = self._matching_rules(name)
+        accepted_by = None
+        for index, rule in enumerate(self.rules):
+            if rule["include_condition"]:
+                if index not in matching:
+                    return FilterDecision(False, rule)
+                accepted_by = accepted_by or rule
+            elif index in matching:
+                return FilterDecision(False, rule)
+        return FilterDecision(True, accepted_by)
+
+
+class LinkType(Enum):
+    RESOURCE = "resource"
+    FOLDER = "folder"
+    URL = "url"
+    PLUGINFILE = "pluginfile"
+    SKIP = "skip"
+
+
+class LinkClassifier:
+    """
+    classifies the links of a course page by the moodle module in their path (/mod/<module>/view.php)
+    every link is split once and matched against one precompiled pattern, the module decides by the
+    allow/deny table Config.LINK_MODULES, direct pluginfile links are always kept
+    """
+
+    LINK_PATTERN = re.compile(r"^(?:/webservice)?/pluginfile\.php/|^/mod/(?P<module>\w+)/")
+    MODULE_TYPES = {"folder": LinkType.FOLDER, "url": LinkType.URL}
+
+    def __init__(self, modules=None, domain=None):
+        """
+        :param modules: dict of module name to True (crawl) or False (skip), "*" is the default
+        :param domain: links to other hosts are skipped, None keeps them
+        """
+        self.modules = modules if modules is not None else {"resource": True, "folder": True, "url": True}
+        self.default = self.modules.get("*", False)
+        self.domain = domain
+
+    def classify(self, link):
+        parts = urlsplit(link)
+        if parts.scheme not in ("http", "https", "") or link.startswith("#"):
+            return LinkType.SKIP
+        if self.domain is not None and parts.netloc and parts.netloc != self.domain:
+            return LinkType.SKIP
+
+        match = self.LINK_PATTERN.match(parts.path)
+        if match is None:
+            return LinkType.SKIP
+        module = match.group("module")
+        if module is None:
+            return LinkType.PLUGINFILE
+        if not self.modules.get(module, self.default):
+            return LinkType.SKIP
+        return self.MODULE_TYPES.get(module, LinkType.RESOURCE)
+
+
+class PageStrainer(SoupStrainer):
+    """
+    SoupStrainer that only builds the top level tags accepted by predicate(name, attrs) and their children
+    implements the parser hooks of bs4 before (search_tag) and since 4.13 (allow_tag_creation)
+    """
+
+    def __init__(self, predicate):
+        super().__init__()
+        self.predicate = predicate
+
+    def _accepts(self, name, attrs):
+        attrs = attrs or {}
+        classes = attrs.get("class") or []
+        if isinstance(classes, str):
+            classes = classes.split()
+        return self.predicate(name, attrs, classes)
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return self._accepts(markup_name, markup_attrs)
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self._accepts(name, attrs)
+
+    def allow_string_creation(self, string):
+        # text outside of the accepted tags is never read
+        return False
+
+
+def _is_coursepage_part(name, attrs, classes):
+    return name == "h1" or (name == "li" and "section" in classes) \
+        or (name == "div" and attrs.get("id") == "card-container")
+
+
+def _is_filepage_part(name, attrs, classes):
+    return name in ("h2", "form", "object") or (name == "img" and "resourceimage" in classes) \
+        or (name == "div" and bool({"resourceworkaround", "urlworkaround", "foldertree"} & set(classes)))
+
+
+DEFAULT_LINK_CLASSIFIER = LinkClassifier()
+
+# only the elements read by extract_coursepage_targets / extract_filepage, the theme chrome is never built
+COURSEPAGE_STRAINER = PageStrainer(_is_coursepage_part)
+FILEPAGE_STRAINER = PageStrainer(_is_filepage_part)
+
+
+def extract_coursepage_targets(soup, source_URL, classifier=None):
+    """
+    extracts the crawl targets of a course page
+    :param soup: the soup of the course page
+    :param source_URL: the URL of the course page
+    :param classifier: LinkClassifier deciding which links are followed, defaults to resources, folders and urls
+    :return: list of course targets (for courses with tiles) or file targets, one for every link in a block
+    """
+    classifier = classifier or DEFAULT_LINK_CLASSIFIER
+    targets = []
+    course_name = soup.select_one("h1").text.strip()
+
+    # is this a special course with tiles?
+    is_existing = soup.select_one("div#card-container")
+    if is_existing is not None:
+        logger.debug(f"found special course {course_name}")
+        courses = soup.select("li.section a[href*='course']")
+        return [{"url": course["href"], "type": "course"} for course in courses]
+
+    # find all blocks on the page
+    blocks = soup.select("li.section")
+    if blocks is None:
+        logger.error(f"no blocks found on {source_URL}")
+        return targets
+
+    # iterate over all blocks
+    for block in blocks:
+        # find name of the block (e.g. "Lernmaterialien")
+        block_name = block.select_one("h4 > a")
+        if block_name is None:
+            block_name = block.select_one("h4 div")
+            if block_name is None:
+                #  logger.error(f"no block name found on {source_URL}")
+                continue
+        if "&section" in source_URL:
+            block_name = block.select_one("h2.section-title")
+
+        block_name = block_name.text.strip()
+        # for each block, find all links
+        # links = self._filter(block.select("a[href]"))
+        links = block.select("a:not([href^='#'])")
+        # names = block.select("a[onclick] > span")
+        names = []
+        for link in links:
+            try:
+                if len(link.contents) == 1 and isinstance(link.contents[0], NavigableString):
+                    names.append(link.contents[0].strip())
+                else:
+                    tag = link.select_one("span:not(.fp-icon)")
+                    if tag is not None:
+                        names.append(tag.contents[0].strip())
+                    else:
+                        names.append("404")
+            except Exception as e:
+                logger.error(f"error while parsing block {block_name} of course {course_name}: {e}")
+
+        if len(links) == 0:
+            #logger.warning(f"no links found in block {block_name} of course {course_name} on {source_URL}")
+            continue
+
+        # iterate over all links
+        for idx, elem in enumerate(links):
+            try:
+                name = names[idx]
+            except IndexError as e:
+                name = "404"
+                logger.error(f"no name found for link {elem['href']} in block {block_name} of course {course_name}")
+            link = elem["href"]
+            link_type = classifier.classify(link)
+            if link_type is LinkType.SKIP:
+                continue
+
+            targets.append({"type": "file", "url": link, "name": name, "block": block_name, "course": course_name,
+                            "link_type": link_type.value})
+
+        logger.debug(f"found {len(links)} links in block {block_name} of course {course_name}")
+
+    return targets
+
+
+def extract_filepage(soup, source_URL, link_type=None):
+    """
+    extracts name and download URL of the file behind a resource or folder page
+    :param soup: the soup of the page
+    :param source_URL: the URL of the page
+    :param link_type: the LinkType value of the page, taken from the URL if not given
+    :return: tuple of file name and file URL
+    """
+    if link_type is None:
+        link_type = DEFAULT_LINK_CLASSIFIER.classify(source_URL).value
+    is_folder = link_type == LinkType.FOLDER.value
+
+    if is_folder:
+        # file name
+        fileName = soup.select_one("h2").text.strip().replace("/", "_")
+        # find form data
+        form_tag = soup.select_one("form:not([id])[method=post]")
+        action = form_tag["action"]
+        value = soup.select_one("input[name=id]")["value"]
+        fileURL = action + "?id=" + value
+
+    else:
+        # find data link
+        tag = soup.select_one(".resourceworkaround a[onclick], .urlworkaround a")
+        if tag is None:
+            # TODO beautify
+            # may be a embedded pdf file like in "https://elearning.fhws.de/mod/resource/view.php?id=681498"
+            # could also be embedded image like in https://elearning.fhws.de/mod/resource/view.php?id=686598
+            tag = soup.select_one("object a")
+        if tag is None:
+            tag = soup.select_one("img.resourceimage")
+            fileURL = tag["src"]
+            fileName = soup.select_one("h2").text.strip()
+        else:
+            fileURL = tag["href"]
+            fileName = tag.text
+
+    return fileName, fileURL
+
+
+def extract_folderpage(soup, source_URL):
+    """
+    extracts the zip download and the file listing of a folder page
+    :return: tuple of folder name, URL of the folder zip and a list of [path inside the folder, URL] of every file
+    """
+    fileName, fileURL = extract_filepage(soup, source_URL, LinkType.FOLDER.value)
+    files = []
+    for link in soup.select(".foldertree .fp-filename-icon a[href]"):
+        # pluginfile.php/<context>/mod_folder/content/<revision>/<path inside the folder>
+        path = re.search(r"/content/\d+/(.+)$", urlsplit(link["href"]).path)
+        files.append([unquote(path.group(1)) if path else link.text.strip(), link["href"]])
+    return fileName, fileURL, files
+
+
+# settings of a parse worker process, set once by _init_parse_worker
+_parse_worker_config = {}
+
+
+def _init_parse_worker(parser, partial, link_modules, domain):
+    _parse_worker_config.update(parser=parser, partial=partial, classifier=LinkClassifier(link_modules, domain))
+
+
+def extract_coursepage_from_markup(markup, source_URL):
+    """
+    runs in a parse worker process: parses a course page and extracts its targets
+    :param markup: the raw bytes of the page
+    :return: list of target dicts, see extract_coursepage_targets
+    """
+    strainer = COURSEPAGE_STRAINER if _parse_worker_config["partial"] else None
+    soup = BeautifulSoup(markup, _parse_worker_config["parser"], parse_only=strainer)
+    return extract_coursepage_targets(soup, source_URL, _parse_worker_config["classifier"])
+
+
+def extract_filepage_from_markup(markup, source_URL, link_type=None):
+    """
+    runs in a parse worker process: parses a resource or folder page
+    :param markup: the raw bytes of the page
+    :return: tuple of file name and file URL, see extract_filepage
+    """
+    strainer = FILEPAGE_STRAINER if _parse_worker_config["partial"] else None
+    soup = BeautifulSoup(markup, _parse_worker_config["parser"], parse_only=strainer)
+    return extract_filepage(soup, source_URL, link_type)
+
+
+def extract_folderpage_from_markup(markup, source_URL):
+    """
+    runs in a parse worker process: parses a folder page
+    :param markup: the raw bytes of the page
+    :return: tuple of folder name, zip URL and files, see extract_folderpage
+    """
+    strainer = FILEPAGE_STRAINER if _parse_worker_config["partial"] else None
+    soup = BeautifulSoup(markup, _parse_worker_config["parser"], parse_only=strainer)
+    return extract_folderpage(soup, source_URL)
+
+
 class Config:
     def __init__(self, config_file=""):
         self.BASE_URL = "https://elearning.fhws.de/course/index.php?mycourses=1"
         self.element_selector = ""
+        # "mode" of a condition: "literal" (default), "glob" or "regex", see CourseFilter
         self.FILTER_COURSES = [
             {
                 "condition_string": "Gründen@FHWS",
@@ -104,15 +553,55 @@ class Config:
             # }
 
         ]
+        # moodle modules (/mod/<module>/) whose links are crawled, "*" decides for modules that are not listed
+        self.LINK_MODULES = {"resource": True, "folder": True, "url": True, "*": False}
+        # plain extensions are excluded, {"filetype": "pdf", "include_condition": True} restricts to included types
         self.FILTER_FILETYPES = []  # ["mat", "csv",...]
         self.THREAD_COUNT = 12
         self.TIMEOUT = 60
         self.DOWNLOAD_PATH = "./scraper_test/"
         self.MAX_FILE_SIZE_IN_MB = 200
+        # "zip" saves a folder as its zip, "extract" extracts the zip into a directory while it downloads and
+        # updates folders extracted before file by file, "files" always downloads the files of a folder one by one
+        self.FOLDER_MODE = "zip"
+        self.CHUNK_SIZE_IN_KB = 512
         self.WEBDRIVER_DIR = "./drivers"
         self.WEBDRIVER_FILE = "chromedriver.exe"
+        self.WEBDRIVER_POOL_SIZE = 2  # headless browsers for dynamic pages, started on demand
+        self.WEBDRIVER_WARMUP = 0  # browsers started ahead of time, in parallel to the login
+        self.WEBDRIVER_MAX_PAGES = 200  # restart a browser after this many pages, 0 never restarts
+        self.WEBDRIVER_MAX_MEMORY_MB = 1024  # restart a browser above this memory usage, needs psutil
+        self.WEBDRIVER_BLOCK_RESOURCES = True  # do not load images, fonts and css in the browser
         self.CREDENTIALS = "credentials.env"
-        self.URLLIB_POOLSIZE = 15
+        self.URLLIB_POOLSIZE = 15  # also the maximum number of concurrent connections per host
+        self.MAX_RETRY = 4  # attempts per request
+        self.RETRY_BACKOFF = 0.5  # seconds, the backoff cap doubles with every attempt
+        self.RETRY_BACKOFF_MAX = 30
+        self.ADAPTIVE_CONCURRENCY = True  # lower concurrent requests below URLLIB_POOLSIZE while the server struggles
+        self.MIN_CONCURRENCY = 2
+        # workers of the pipeline stages: course discovery, resolving file pages and downloading files
+        self.STAGE_THREADS = {"discovery": 4, "resolve": 8, "download": self.THREAD_COUNT}
+        self.STAGE_QUEUE_SIZE = 50  # targets that may wait for a busy stage before the previous stage blocks
+        self.MANIFEST_FILE = ""  # defaults to DOWNLOAD_PATH/.kraken_manifest.jsonl
+        self.CHECKPOINT_FILE = ""  # defaults to DOWNLOAD_PATH/.kraken_checkpoint.json
+        self.CHECKPOINT_INTERVAL = 60  # seconds, 0 disables checkpointing
+        self.SHARD_QUEUE = ""  # work queue directory of a sharded crawl, defaults to DOWNLOAD_PATH/.kraken_shards
+        self.SHARD_COURSES = []  # lists of course ids that are crawled as a shard of their own
+        self.SHARD_STALL_TIMEOUT = 600  # seconds the coordinator waits for shards of other nodes that show no progress
+        self.WRITER_THREADS = 8  # threads that write downloads to disk, 0 writes in the download workers
+        self.WRITER_QUEUE_SIZE = 64  # chunks a writer thread may fall behind before a download waits for it
+        self.WRITER_FSYNC_BATCH = 0  # fsync downloads before they are renamed, up to this many at once, 0 never
+        self.CONTENT_STORE = ""  # directory for content addressed storage, empty to save files directly
+        self.CONTENT_STORE_LINK = "hardlink"  # "hardlink" or "symlink"
+        self.PARSER = "html.parser"  # "html.parser", "lxml" (fastest) or "html5lib" (most lenient)
+        self.PARTIAL_PARSING = True  # only parse the parts of course and file pages the crawler reads
+        self.PARSE_PROCESSES = 0  # processes that parse course and file pages, 0 parses in the worker threads
+        self.EXTRACTION_CACHE_FILE = ""  # defaults to DOWNLOAD_PATH/.kraken_extraction_cache.json
+        self.EXTRACTION_CACHE_SIZE = 50000  # pages whose extracted results are kept, 0 disables the cache
+        self.ENGINE = "threads"  # "threads" or "asyncio"
+        self.ASYNC_CONCURRENCY = {"course": 20, "file": 100, "download": 50}
+        self.PROGRESS_INTERVAL = 30  # seconds between progress log lines, 0 disables them
+        self.METRICS_FILE = ""  # metrics snapshot written every progress interval, .prom for prometheus, else json
 
         if config_file != "":
             self.read_config(config_file)
@@ -123,13 +612,88 @@ class Config:
             self.BASE_URL = cf_json.get("baseURL", self.BASE_URL)
             self.element_selector = cf_json.get("element_selector", self.element_selector)
             self.FILTER_COURSES = cf_json.get("filter_courses", self.FILTER_COURSES)
+            self.FILTER_FILETYPES = cf_json.get("filter_filetypes", self.FILTER_FILETYPES)
+            self.LINK_MODULES = {**self.LINK_MODULES, **cf_json.get("link_modules", {})}
             self.DOWNLOAD_PATH = cf_json.get("saveDirectory", self.DOWNLOAD_PATH)
 
             self.THREAD_COUNT = cf_json.get("threadCount", self.THREAD_COUNT)
+            self.STAGE_THREADS = {**self.STAGE_THREADS, "download": self.THREAD_COUNT,
+                                  **cf_json.get("stageThreads", {})}
+            self.STAGE_QUEUE_SIZE = cf_json.get("stageQueueSize", self.STAGE_QUEUE_SIZE)
             self.TIMEOUT = cf_json.get("timeout", self.TIMEOUT)
+            self.MAX_FILE_SIZE_IN_MB = cf_json.get("maxFileSizeInMB", self.MAX_FILE_SIZE_IN_MB)
+            self.FOLDER_MODE = cf_json.get("folderMode", self.FOLDER_MODE)
+            self.CHUNK_SIZE_IN_KB = cf_json.get("chunkSizeInKB", self.CHUNK_SIZE_IN_KB)
             self.WEBDRIVER_DIR = cf_json.get("webdriver_dir", self.WEBDRIVER_DIR)
             self.WEBDRIVER_FILE = cf_json.get("webdriver_file", self.WEBDRIVER_FILE)
+            self.WEBDRIVER_POOL_SIZE = cf_json.get("webdriver_pool_size", self.WEBDRIVER_POOL_SIZE)
+            self.WEBDRIVER_WARMUP = cf_json.get("webdriver_warmup", self.WEBDRIVER_WARMUP)
+            self.WEBDRIVER_MAX_PAGES = cf_json.get("webdriver_max_pages", self.WEBDRIVER_MAX_PAGES)
+            self.WEBDRIVER_MAX_MEMORY_MB = cf_json.get("webdriver_max_memory_mb", self.WEBDRIVER_MAX_MEMORY_MB)
+            self.WEBDRIVER_BLOCK_RESOURCES = cf_json.get("webdriver_block_resources", self.WEBDRIVER_BLOCK_RESOURCES)
             self.CREDENTIALS = cf_json.get("credentials", self.CREDENTIALS)
+            self.URLLIB_POOLSIZE = cf_json.get("urllibPoolSize", self.URLLIB_POOLSIZE)
+            self.MAX_RETRY = cf_json.get("maxRetry", self.MAX_RETRY)
+            self.RETRY_BACKOFF = cf_json.get("retryBackoff", self.RETRY_BACKOFF)
+            self.RETRY_BACKOFF_MAX = cf_json.get("retryBackoffMax", self.RETRY_BACKOFF_MAX)
+            self.ADAPTIVE_CONCURRENCY = cf_json.get("adaptiveConcurrency", self.ADAPTIVE_CONCURRENCY)
+            self.MIN_CONCURRENCY = cf_json.get("minConcurrency", self.MIN_CONCURRENCY)
+            self.MANIFEST_FILE = cf_json.get("manifest", self.MANIFEST_FILE)
+            self.CHECKPOINT_FILE = cf_json.get("checkpoint", self.CHECKPOINT_FILE)
+            self.CHECKPOINT_INTERVAL = cf_json.get("checkpointInterval", self.CHECKPOINT_INTERVAL)
+            self.SHARD_QUEUE = cf_json.get("shardQueue", self.SHARD_QUEUE)
+            self.SHARD_COURSES = cf_json.get("shardCourses", self.SHARD_COURSES)
+            self.SHARD_STALL_TIMEOUT = cf_json.get("shardStallTimeout", self.SHARD_STALL_TIMEOUT)
+            self.WRITER_THREADS = cf_json.get("writerThreads", self.WRITER_THREADS)
+            self.WRITER_QUEUE_SIZE = cf_json.get("writerQueueSize", self.WRITER_QUEUE_SIZE)
+            self.WRITER_FSYNC_BATCH = cf_json.get("writerFsyncBatch", self.WRITER_FSYNC_BATCH)
+            self.CONTENT_STORE = cf_json.get("contentStore", self.CONTENT_STORE)
+            self.CONTENT_STORE_LINK = cf_json.get("contentStoreLink", self.CONTENT_STORE_LINK)
+            self.PARSER = cf_json.get("parser", self.PARSER)
+            self.PARTIAL_PARSING = cf_json.get("partialParsing", self.PARTIAL_PARSING)
+            self.PARSE_PROCESSES = cf_json.get("parseProcesses", self.PARSE_PROCESSES)
+            self.EXTRACTION_CACHE_FILE = cf_json.get("extractionCache", self.EXTRACTION_CACHE_FILE)
+            self.EXTRACTION_CACHE_SIZE = cf_json.get("extractionCacheSize", self.EXTRACTION_CACHE_SIZE)
+            self.ENGINE = cf_json.get("engine", self.ENGINE)
+            self.PROGRESS_INTERVAL = cf_json.get("progressInterval", self.PROGRESS_INTERVAL)
+            self.METRICS_FILE = cf_json.get("metricsFile", self.METRICS_FILE)
+            self.ASYNC_CONCURRENCY = {**self.ASYNC_CONCURRENCY, **cf_json.get("asyncConcurrency", {})}
+
+
+class FileTypeFilter:
+    """
+    decides which file types are downloaded, configured by Config.FILTER_FILETYPES
+    entries are either a plain extension, which is excluded, or a dict like FILTER_COURSES:
+    {"filetype": "mp4", "include_condition": False}
+    as soon as one include condition exists only included file types are downloaded
+    """
+
+    def __init__(self, conditions):
+        self.included = set()
+        self.excluded = set()
+        for condition in conditions:
+            if isinstance(condition, str):
+                self.excluded.add(self._normalize(condition))
+            elif condition["include_condition"]:
+                self.included.add(self._normalize(condition["filetype"]))
+            else:
+                self.excluded.add(self._normalize(condition["filetype"]))
+
+    @staticmethod
+    def _normalize(file_type):
+        return file_type.strip().lstrip(".").lower()
+
+    def is_allowed(self, file_type):
+        """
+        :param file_type: extension with or without dot, empty if not known (yet)
+        :return: False if the file type is excluded, unknown types are allowed to be decided on later
+        """
+        if not file_type:
+            return True
+        file_type = self._normalize(file_type)
+        if file_type in self.excluded:
+            return False
+        return not self.included or file_type in self.included
 
 
 class RedirectException(Exception):
@@ -139,276 +703,2233 @@ class RedirectException(Exception):
         self.new_url = new_url
 
 
-class SoupChef:
+class RangeNotSatisfiableException(Exception):
+    """Raised when a partial download does not fit the file on the server anymore"""
 
-    def __init__(self, driverConfig=None):
-        if driverConfig is None:
-            self.config = {
-                "MAX_RETRY": 3,
-                "TIMEOUT": 60,
-                "WEBDRIVER_DIR": "./drivers",
-                "WEBDRIVER_FILE": "chromedriver.exe"
-            }
-        else:
-            self.config = driverConfig
 
-        self.driver = None
-        self.soup = None
-        self.Parser = 'html.parser'
+class SessionExpiredException(Exception):
+    """raised when moodle answers with its login page instead of the requested page or file"""
 
-    def _get_webdriver(self):
-        """
-        returns a webdriver for selenium
-        expects you to have the file in a directory named after your os (linux / windows / if you use mac, go buy linux)
-        https://www.makeuseof.com/how-to-install-selenium-webdriver-on-any-computer-with-python/
-        """
-        path = None
-        try:
-            driver_options = Options()
-            # driver_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-            # trying to block logging from webdriver as it spams the log unnecessarily
-            driver_options.headless = True
+    def __init__(self, url):
+        super().__init__(f"session expired while requesting {url}")
+        self.url = url
 
-            if os.name == 'posix':
-                path = os.path.join(self.config["WEBDRIVER_DIR"], "linux", self.config["WEBDRIVER_FILE"])
-                ser = Service(path)
-                return webdriver.Chrome(service=ser, options=driver_options, service_log_path='/dev/null')
-            else:
-                path = os.path.join(self.config["WEBDRIVER_DIR"], "windows", self.config["WEBDRIVER_FILE"])
-                ser = Service(path)
-                return webdriver.Chrome(service=ser, options=driver_options, service_log_path='NUL')
 
-        except Exception as e:
-            logger.error("failed to initialize webdriver for selenium, /"
-                         "make sure you downloaded a driver and wrote the correct path to config, /"
-                         "current path: " + path)
-            logger.error(e)
+class FileTooBigException(Exception):
+    """Raised when a streamed download exceeds the configured size limit"""
 
-    def get_soup_from_URL(self, URL, session=None, dynamic=False):
-        if dynamic:
-            if not self.driver:
-                self.driver = self._get_webdriver()
-            self.soup = self._get_soup_of_dynamic_page(URL, session=session)
-        else:
-            self.soup = self._get_soup_of_static_page(URL, session=session)
-        return self.soup
+    def __init__(self, received_bytes):
+        self.received_bytes = received_bytes
 
-    def get_soup_from_text(self, text):
-        self.soup = BeautifulSoup(text, self.Parser)
-        return self.soup
 
-    def _get_soup_of_static_page(self, URL, session=None):
-        """
-        parses the given URL and returns the soup
-        object of a static loaded page
-        :param URL: the URL to parse
-        :return: the soup object
-        """
-        page = None
-        retry_count = 0
-        while page is None and retry_count < self.config["MAX_RETRY"]:
-            try:
-                retry_count += 1
-                if session is None:
-                    page = requests.get(URL, timeout=self.config["TIMEOUT"], allow_redirects=False)
-                else:
-                    page = session.get(URL, timeout=self.config["TIMEOUT"], allow_redirects=False)
+class ZipStreamError(Exception):
+    """Raised when a zip can not be extracted while it downloads, e.g. a stored member without sizes"""
 
-            except Exception as e:
-                if retry_count == self.config["MAX_RETRY"] - 1:  # TODO: make this a config option
-                    logger.error("request unable to get: " + URL)
-                return None
 
-        if page.status_code == 303:
-            logger.debug("request got redirected: " + URL + " to " + page.url)
-            # this means the file is a forced download, so we can't scrape the page
-            raise RedirectException(page.headers["Location"])
+class Manifest:
+    """
+    persistent record of all saved files, stored as json lines in the download directory
+    every line holds url, path, etag, last_modified, size and sha256 of one saved file,
+    later lines win over earlier lines of the same url, so appending is enough to update an entry
+    """
 
-        soup = BeautifulSoup(page.content, self.Parser)
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._load()
 
-        if soup is None:
-            logger.error("No soup could be cooked for" + URL + " !")
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        for entry in self._read(self.path):
+            self.entries[entry["url"]] = entry
+        logger.info(f"loaded {len(self.entries)} entries from manifest {self.path}")
 
-        return soup
+    @staticmethod
+    def _read(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last line may be cut off if the previous run got killed while writing
+                    logger.warning(f"skipping corrupt manifest line in {path}")
 
-    def _get_soup_of_dynamic_page(self, URL, session=None):
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def conditional_headers(self, url):
         """
-        parses the given URL and returns the soup
-        object of a dynamic loaded page
-        :param URL: the URL to parse
-        :return: the soup object
+        builds the If-None-Match / If-Modified-Since headers for a url that was saved before
+        :param url: the file url
+        :return: dict of headers, empty if the file is unknown or no longer on disk
         """
-        if session is not None:
-            for cookie in session.cookies:
-                self.driver.add_cookie({'name': cookie.name, 'value': cookie.value})
+        entry = self.get(url)
+        if entry is None or not os.path.exists(entry["path"]):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url, path, headers, size, sha256):
+        entry = {
+            "url": url,
+            "path": path,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": size,
+            "sha256": sha256
+        }
+        with self.lock:
+            self.entries[url] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
 
-        page = None
-        retry_count = 0
-        while page is None and retry_count < self.config["MAX_RETRY"]:
-            try:
-                retry_count += 1
-                self.driver.get(URL)
-                # time.sleep(1)  # load page
-                page = self.driver.page_source
+    def merge(self, paths):
+        """
+        takes over the entries of other manifests, e.g. of the shards of a crawl, and compacts the result
+        entries that equal the ones of this manifest are skipped, shards start from a copy of it and must not
+        turn back what another shard updated
+        """
+        with self.lock:
+            base = dict(self.entries)
+            for path in paths:
+                for entry in self._read(path):
+                    if entry != base.get(entry["url"]):
+                        self.entries[entry["url"]] = entry
+        self.compact()
+        logger.info(f"merged {len(paths)} manifests into {self.path}, {len(self.entries)} entries")
+
+    def compact(self):
+        """rewrites the manifest with exactly one line per url"""
+        with self.lock:
+            if not self.entries:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
 
-            except Exception as e:
-                if retry_count == self.config["MAX_RETRY"] - 1:
-                    logger.error("chromeDriver unable to get: " + URL)
-                return None
 
-        soup = BeautifulSoup(page, self.Parser)
+class Checkpoint:
+    """
+    on-disk journal of a running crawl, holds the frontier, the visited urls, the targets that were handed
+    to a worker but did not finish yet and the partial downloads that can be resumed with range requests
+    """
 
-        if soup is None:
-            logger.error("No soup could be cooked for" + URL + " !")
+    def __init__(self, path):
+        self.path = path
 
-        return soup
+    def exists(self):
+        return os.path.exists(self.path)
 
-    def shutdown(self):
-        if self.driver:
-            logger.info("shutting down webdriver")
-            self.driver.quit()
+    def save(self, pending, visited, in_flight, partial_downloads):
+        state = {
+            "saved_at": time.time(),
+            "pending": pending,
+            "visited": sorted(visited),
+            "in_flight": in_flight,
+            "partial_downloads": partial_downloads
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
 
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
 
-class Kraken:
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
 
-    def __init__(self, scraping_config):
-        self.config = scraping_config
-        self.to_visit = Queue()
-        self.to_visit.put({"url": self.config.BASE_URL, "type": "base"})
-        self.visited = set()
-        self.files = Queue()
-        self.domain = urlsplit(self.config.BASE_URL).netloc
-        self.pool = ThreadPoolExecutor(max_workers=self.config.THREAD_COUNT)
-        self.session = None
-        self.soupChef = SoupChef({"MAX_RETRY": 4, "TIMEOUT": 60, "WEBDRIVER_DIR": scraping_config.WEBDRIVER_DIR,
-                                  "WEBDRIVER_FILE": scraping_config.WEBDRIVER_FILE})
-        self.ajaxCalls = (
-            'https://elearning.fhws.de/theme/remui/request_handler.php?action=get_courses_ajax&wdmdata={'
-            '%22category%22:%22all%22,%22sort%22:null,%22search%22:%22%22,%22tab%22:true,%22page%22:{%22courses%22:0,'
-            '%22mycourses%22:%22 ',
-            '%22},%22pagination%22:true,%22view%22:%22grid%22,%22isFilterModified%22:true}')
 
-    def run(self):
-        # first login to get the session cookies and then start the scraping with a session for every thread with
-        # saved cookies
-        self._init_session()
-        self._do_login()
+class ZipStreamExtractor:
+    """
+    extracts a zip while it downloads: feed() takes the chunks of the response as they arrive and every member is
+    decompressed straight into a .part file next to its final path, the archive itself is never written to disk
+    only the local file headers are read, members that end in a data descriptor (as the zips of moodle's
+    download_folder do) are delimited by the end of their deflate stream. encrypted members, other compression
+    methods and stored members without sizes raise ZipStreamError, such a zip has to be saved and extracted
+    with extract_archive instead
+    :param folder_dir: the directory the members are extracted into
+    :param on_member: called with member name, final path, part path, sha256 and size of every extracted member
+    :param accept: predicate on the member name, rejected members are decompressed and dropped
+    :param max_bytes: size limit of a single extracted member, 0 for no limit
+    :param open_file: opens the part file of a member for writing, e.g. DiskWriter.open, creates missing
+        directories and writes directly by default
+    """
 
-        while True:
+    LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+    LOCAL_HEADER_SIGNATURE = 0x04034b50
+    DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+    # central directory, zip64 end of central directory and end of central directory
+    END_SIGNATURES = (0x02014b50, 0x06064b50, 0x06054b50)
+    OUTPUT_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, folder_dir, on_member, accept=None, max_bytes=0, open_file=None):
+        self.folder_dir = folder_dir
+        self.on_member = on_member
+        self.accept = accept
+        self.max_bytes = max_bytes
+        self.open_file = open_file or self._open_file
+        self.buffer = bytearray()
+        self.member = None
+        self.finished = False
+
+    def feed(self, data):
+        self.buffer += data
+        try:
+            while not self.finished and (self._read_data() if self.member else self._read_header()):
+                pass
+        except BaseException:
+            self.abort()
+            raise
+
+    def close(self):
+        """:raises ZipStreamError: if the archive ended before its central directory"""
+        if not self.finished:
+            self.abort()
+            raise ZipStreamError("the archive ended before its central directory")
+
+    def abort(self):
+        """removes the part file of a member that is extracted right now"""
+        member, self.member = self.member, None
+        if member is not None and member["file"] is not None:
             try:
-                target = self.to_visit.get(block=True, timeout=15)  # first time takes some while..
-                self.visited.add(target["url"])
-                self.pool.submit(self.scrape, target)
-                #self.scrape(target)
-
-            except Empty:
-                self._shutdown()
-                break
-            except Exception as e:
-                print(e)
-                logger.error(e)
-                break
-
-        logger.info("finished scraping")
-        logger.info(f"visited: {len(self.visited)}")
-
-    def scrape(self, target):
-        url = target["url"]
+                member["file"].close()
+            except OSError:
+                pass
+            if os.path.exists(member["part_path"]):
+                os.remove(member["part_path"])
+
+    def extract_archive(self, path):
+        """extracts a complete zip file, for zips that can not be extracted as a stream"""
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                self._open_member(info.filename)
+                try:
+                    with archive.open(info) as f:
+                        for chunk in iter(lambda: f.read(self.OUTPUT_CHUNK_SIZE), b""):
+                            self._write(chunk)
+                except BaseException:
+                    self.abort()
+                    raise
+                # zipfile checks the crc itself
+                self._close_member(None)
+
+    def _read_header(self):
+        if len(self.buffer) < 4:
+            return False
+        signature = int.from_bytes(self.buffer[:4], "little")
+        if signature in self.END_SIGNATURES:
+            # the central directory only repeats the local headers
+            self.finished = True
+            self.buffer.clear()
+            return False
+        if signature != self.LOCAL_HEADER_SIGNATURE:
+            raise ZipStreamError(f"unexpected signature {signature:#010x}")
+        if len(self.buffer) < self.LOCAL_HEADER.size:
+            return False
+        _, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = \
+            self.LOCAL_HEADER.unpack_from(self.buffer)
+        header_length = self.LOCAL_HEADER.size + name_length + extra_length
+        if len(self.buffer) < header_length:
+            return False
+        name = bytes(self.buffer[self.LOCAL_HEADER.size:self.LOCAL_HEADER.size + name_length])
+        name = name.decode("utf-8" if flags & 0x800 else "cp437")
+        zip64, compressed_size = self._get_zip64_size(
+            bytes(self.buffer[self.LOCAL_HEADER.size + name_length:header_length]), size, compressed_size)
+        del self.buffer[:header_length]
+
+        if flags & 0x1:
+            raise ZipStreamError(f"{name} is encrypted")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ZipStreamError(f"{name} uses compression method {method}")
+        has_descriptor = bool(flags & 0x8)
+        if has_descriptor and method == zipfile.ZIP_STORED:
+            raise ZipStreamError(f"the end of the stored member {name} is unknown")
+        self._open_member(name)
+        self.member.update(method=method, crc=crc, zip64=zip64, has_descriptor=has_descriptor,
+                           remaining=None if has_descriptor else compressed_size,
+                           decompressor=zlib.decompressobj(-zlib.MAX_WBITS) if method else None)
+        return True
 
-        if self._is_relative_URL(url):
-            source_URL = self.config.BASE_URL + url
+    @staticmethod
+    def _get_zip64_size(extra, size, compressed_size):
+        """:return: tuple of true if the header has a zip64 extra field and the compressed size from it"""
+        offset = 0
+        while offset + 4 <= len(extra):
+            field_id, field_length = struct.unpack_from("<HH", extra, offset)
+            if field_id == 0x0001:
+                values = list(struct.unpack_from(f"<{field_length // 8}Q", extra, offset + 4))
+                # the field only holds the sizes that do not fit into the header, uncompressed first
+                if size == 0xFFFFFFFF and values:
+                    values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values:
+                    compressed_size = values.pop(0)
+                return True, compressed_size
+            offset += 4 + field_length
+        return False, compressed_size
+
+    def _read_data(self):
+        member = self.member
+        if member["decompressor"] is None and member["remaining"] is None:
+            return self._read_data_descriptor()
+        data = bytes(self.buffer if member["remaining"] is None else self.buffer[:member["remaining"]])
+        if not data and member["remaining"]:
+            return False
+
+        if member["method"] == zipfile.ZIP_STORED:
+            self._write(data)
+            consumed = len(data)
         else:
-            source_URL = url
+            decompressor = member["decompressor"]
+            tail = data
+            while tail and not decompressor.eof:
+                # bounded output, a small chunk of a zip bomb must not fill the memory
+                self._write(decompressor.decompress(tail, self.OUTPUT_CHUNK_SIZE))
+                tail = decompressor.unconsumed_tail
+            consumed = len(data) - len(decompressor.unused_data)
+        del self.buffer[:consumed]
+        if member["remaining"] is not None:
+            member["remaining"] -= consumed
+
+        if member["method"] == zipfile.ZIP_DEFLATED and not member["decompressor"].eof:
+            if member["remaining"] == 0:
+                raise ZipStreamError(f"the deflate stream of {member['name']} is cut off")
+            return False
+        if member["remaining"]:
+            return False
+        if member["has_descriptor"]:
+            # the data descriptor follows, see _read_data_descriptor
+            member["decompressor"] = None
+            return True
+        self._close_member(member["crc"])
+        return True
+
+    def _read_data_descriptor(self):
+        """reads crc and sizes that follow the data of a member, the signature in front of them is optional"""
+        if len(self.buffer) < 4:
+            return False
+        offset = 4 if int.from_bytes(self.buffer[:4], "little") == self.DATA_DESCRIPTOR_SIGNATURE else 0
+        length = offset + (20 if self.member["zip64"] else 12)
+        if len(self.buffer) < length:
+            return False
+        crc = int.from_bytes(self.buffer[offset:offset + 4], "little")
+        del self.buffer[:length]
+        self._close_member(crc)
+        return True
+
+    def _open_member(self, name):
+        path = get_folder_member_path(self.folder_dir, name)
+        wanted = path is not None and (self.accept is None or self.accept(name))
+        self.member = {"name": name, "path": path, "part_path": None, "file": None, "size": 0, "crc32": 0,
+                       "sha256": hashlib.sha256()}
+        if wanted:
+            self.member["part_path"] = path + ".part"
+            self.member["file"] = self.open_file(self.member["part_path"], "wb")
 
-        try:
-            if target["type"] == "base":
-                courses = self._filter(self._get_courses())
-                for course in courses:
-                    if course not in self.visited:
-                        self.to_visit.put({"url": course, "type": "course"})
+    @staticmethod
+    def _open_file(path, mode):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, mode)
 
-            elif target["type"] == "course":
-                self.parse_coursepage(source_URL)
+    def _write(self, data):
+        member = self.member
+        if member["file"] is None or not data:
+            return
+        member["size"] += len(data)
+        if self.max_bytes and member["size"] > self.max_bytes:
+            raise FileTooBigException(member["size"])
+        member["crc32"] = zlib.crc32(data, member["crc32"])
+        member["sha256"].update(data)
+        member["file"].write(data)
+
+    def _close_member(self, crc):
+        """:param crc: the crc32 from the header or data descriptor, None if it is checked elsewhere"""
+        member = self.member
+        if member["file"] is None:
+            self.member = None
+            return
+        if crc is not None and crc != member["crc32"]:
+            raise ZipStreamError(f"crc of {member['name']} does not match")
+        member["file"].close()
+        self.member = None
+        self.on_member(member["name"], member["path"], member["part_path"], member["sha256"].hexdigest(),
+                       member["size"])
 
-            else:
-                if target["name"] == "404":
-                    print("hi 404")
-                file_name, file_url = self.parse_filepage(source_URL)
-                if file_name is not None and file_url is not None:
-                    if self.domain != urlparse(file_url).netloc:
-                        logger.debug(f"skipping {file_url} because it is not on the same domain")
-                        return
-                    self.save_file({"file_name": file_name, "file_url": file_url, "folder_name": target["block"],
-                                    "course_name": target["course"]})
 
-        except Exception as e:
-            logger.error(e)
-            print(e)
+class ExtractionCache:
+    """
+    persistent LRU cache of what was extracted from course and file pages, so re-crawls do not parse
+    unchanged pages again. an entry stays valid while the server answers 304 to its ETag / Last-Modified
+    or the page body has the same hash, moodle rarely sends validators for its php pages, so the hash is
+    what usually hits. the sesskey in every page changes with each login and is left out of the hash
+    """
 
-    def _do_login(self):
-        flag = load_dotenv(config.CREDENTIALS)
-        if not flag:
-            raise Exception("Credentials file not found")
+    VOLATILE_PARTS = re.compile(rb"sesskey[\"'=:\s]+\w+")
 
-        logger.info("successfully loaded credentials-file")
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self._load()
 
-        login_url, token = self._get_form_data(self.config.BASE_URL)  # 'https://elearning.fhws.de/login/index.php'
-        login_data = {
-            'username': os.environ.get('STUDENT_USER'),
-            'password': os.environ.get('STUDENT_PASSWORD'),
-            'logintoken': token
-        }
-        response = self.session.post(login_url, data=login_data)
-        if response.status_code != 200:
-            logger.error("login failed")
+    def _load(self):
+        if not os.path.exists(self.path):
             return
-        logger.info("login successful")
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = OrderedDict(json.load(f))
+        except ValueError:
+            logger.warning(f"ignoring corrupt extraction cache {self.path}")
+            return
+        logger.info(f"loaded {len(self.entries)} entries from extraction cache {self.path}")
 
-    def _get_courses(self):
-        index = 0
-        courses = []
+    @staticmethod
+    def key(kind, url):
+        return f"{kind} {canonicalize_url(url)}"
 
-        response = self.session.get(self.ajaxCalls[0] + str(index) + self.ajaxCalls[1])
-        if response.status_code == 200:
-            logger.info(f"ajax call (nr: {index}) successful - received {len(response.json()['courses'])} courses")
-        else:
-            logger.error(f"ajax call (nr: {index}) failed")
+    @classmethod
+    def digest(cls, content):
+        return hashlib.sha256(cls.VOLATILE_PARTS.sub(b"", content)).hexdigest()
 
-        content = response.json()
-        requested_courses = content["courses"]
-        if len(requested_courses) == 0:
-            logger.error("no courses received during ajax call")
+    @staticmethod
+    def conditional_headers(entry):
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, headers, digest, result):
+        """stores the result of a page, validators missing in headers (e.g. of a 304) are kept"""
+        with self.lock:
+            old = self.entries.pop(key, {})
+            self.entries[key] = {"etag": headers.get("ETag") or old.get("etag"),
+                                 "last_modified": headers.get("Last-Modified") or old.get("last_modified"),
+                                 "sha256": digest, "result": result}
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self.entries.items()), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+
+    def merge(self, paths):
+        """
+        takes over the entries of other caches, e.g. of the shards of a crawl, the later ones win
+        entries that equal the ones of this cache are skipped like in Manifest.merge
+        """
+        with self.lock:
+            base = dict(self.entries)
+        for path in paths:
+            other = ExtractionCache(path, self.max_entries)
+            with self.lock:
+                for key, entry in other.entries.items():
+                    if entry == base.get(key):
+                        continue
+                    self.entries.pop(key, None)
+                    self.entries[key] = entry
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        logger.info(f"merged {len(paths)} extraction caches into {self.path}, {len(self.entries)} entries")
+
+
+class ShardQueue:
+    """
+    file based work queue of the shards of a crawl, in a directory that all nodes can reach
+    pending/ holds one json file per shard, a worker claims a shard by renaming it to claimed/, which is atomic,
+    so every shard is crawled by exactly one worker, and moves it to done/ when the shard is finished
+    a claimed shard names its owner, the host and process id of its worker
+    next to the shards are the cookies of the shared login and the manifest, checkpoint and extraction cache
+    of every shard
+    """
+
+    def __init__(self, path):
+        self.path = path
+        for folder in ("pending", "claimed", "done", "manifests", "checkpoints", "caches"):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+        self.cookie_path = os.path.join(path, "cookies.json")
+
+    def _folder(self, folder, name=""):
+        return os.path.join(self.path, folder, name)
+
+    def _names(self, folder):
+        return sorted(name for name in os.listdir(self._folder(folder)) if name.endswith(".json"))
+
+    def reset(self):
+        """removes the shards, manifests, checkpoints and caches of an earlier crawl"""
+        for folder in ("pending", "claimed", "done", "manifests", "checkpoints", "caches"):
+            for name in os.listdir(self._folder(folder)):
+                os.remove(self._folder(folder, name))
+
+    def put(self, shards):
+        for index, courses in enumerate(shards):
+            self._write("pending", f"shard-{index:04d}.json", {"index": index, "courses": courses})
+
+    def _write(self, folder, name, shard):
+        tmp_path = self._folder(folder, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(shard, f)
+        os.replace(tmp_path, self._folder(folder, name))
+
+    def _read(self, folder, name):
+        with open(self._folder(folder, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def owner(pid=None):
+        """:return: the owner of the shards claimed by the process pid of this host, by default this process"""
+        return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+    def claim(self):
+        """:return: tuple of the name and the course URLs of a shard nobody else works on, None if all are taken"""
+        for name in self._names("pending"):
+            try:
+                os.rename(self._folder("pending", name), self._folder("claimed", name))
+            except FileNotFoundError:
+                # another worker was faster
+                continue
+            shard = self._read("claimed", name)
+            self._write("claimed", name, {**shard, "owner": self.owner()})
+            return name, shard["courses"]
+        return None
+
+    def complete(self, name):
+        os.replace(self._folder("claimed", name), self._folder("done", name))
+
+    def requeue_claimed(self, owners=None):
+        """
+        hands shards of workers that died back to the queue, they continue from their checkpoints
+        :param owners: only requeue the shards of these owners, all claimed shards if None
+        :return: the names of the requeued shards
+        """
+        requeued = []
+        for name in self._names("claimed"):
+            try:
+                if owners is not None and self._read("claimed", name).get("owner") not in owners:
+                    continue
+                os.replace(self._folder("claimed", name), self._folder("pending", name))
+            except FileNotFoundError:
+                # completed in the meantime
+                continue
+            requeued.append(name)
+        return requeued
+
+    def has_shards(self):
+        return bool(self._names("pending") or self._names("claimed"))
+
+    def has_claimed(self):
+        return bool(self._names("claimed"))
+
+    def progress(self):
+        """:return: changes whenever a worker finishes a shard or writes to the manifest or checkpoint of one"""
+        files = [self._folder(folder, name) for folder in ("manifests", "checkpoints")
+                 for name in os.listdir(self._folder(folder))]
+        mtimes = []
+        for path in files:
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except FileNotFoundError:
+                continue
+        return len(self._names("done")), max(mtimes, default=0)
+
+    def manifest_path(self, name):
+        return self._folder("manifests", name.replace(".json", ".jsonl"))
+
+    def checkpoint_path(self, name):
+        return self._folder("checkpoints", name)
+
+    def cache_path(self, name):
+        return self._folder("caches", name)
+
+    def manifests(self):
+        return [self._folder("manifests", name) for name in sorted(os.listdir(self._folder("manifests")))
+                if name.endswith(".jsonl")]
+
+    def caches(self):
+        return [self._folder("caches", name) for name in self._names("caches")]
+
+
+class Histogram:
+    """cumulative histogram with fixed upper bounds like the prometheus client, not thread safe on its own"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum,
+                "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}}
+
+
+class Metrics:
+    """
+    thread safe counters, gauges and timing histograms of a crawl
+    timings: fetch and parse of pages in SoupChef, resolve of file pages, downloads, disk writes of the DiskWriter
+    snapshots are written as json or, for a path ending in .prom, in the prometheus text format
+    """
+
+    TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    # prometheus label name of labeled metrics, the others are labeled by stage
+    LABEL_NAMES = {"requests": "status", "queue_depth": "type", "in_flight": "type", "folder_members": "result",
+                   "extraction_cache": "result"}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.histograms = {}
+        # (name, label) to value, label is None for unlabeled metrics
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(self.TIME_BUCKETS)
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name, amount=1, label=None):
+        with self.lock:
+            self.counters[(name, label)] = self.counters.get((name, label), 0) + amount
+
+    def set_gauge(self, name, value, label=None):
+        with self.lock:
+            self.gauges[(name, label)] = value
+
+    def response_hook(self, response, *args, **kwargs):
+        """requests hook, counts every response of a session by its status code"""
+        self.count("requests", label=str(response.status_code))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_seconds": time.monotonic() - self.started,
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                "counters": self._group(self.counters),
+                "gauges": self._group(self.gauges),
+            }
+
+    @staticmethod
+    def _group(values):
+        grouped = {}
+        for (name, label), value in values.items():
+            if label is None:
+                grouped[name] = value
+            else:
+                grouped.setdefault(name, {})[label] = value
+        return grouped
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"kraken_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                declared = set()
+                for (name, label), value in sorted(values.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                    metric = f"kraken_{name}_total" if kind == "counter" else f"kraken_{name}"
+                    if metric not in declared:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        declared.add(metric)
+                    labels = f'{{{self.LABEL_NAMES.get(name, "stage")}="{label}"}}' if label is not None else ""
+                    lines.append(f"{metric}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """writes a snapshot to path, replaced atomically so readers never see a half written file"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def progress_line(self):
+        """one line summary of throughput and where the time goes"""
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            pages = self.counters.get(("pages", None), 0)
+            downloaded = self.counters.get(("bytes_downloaded", None), 0)
+            requests_total = sum(value for (name, _), value in self.counters.items() if name == "requests")
+            retries = self.counters.get(("retries", None), 0)
+            timings = ", ".join(f"{name} {histogram.sum / histogram.count * 1000:.0f}ms"
+                                for name, histogram in sorted(self.histograms.items()) if histogram.count)
+            busy = ", ".join(f"{label} {value:.0%}" for (name, label), value in sorted(self.gauges.items())
+                             if name == "worker_utilization")
+        return (f"{pages} pages ({pages / elapsed:.1f}/s), {downloaded / 1000 ** 2:.1f} MB "
+                f"({downloaded / 1000 ** 2 / elapsed:.2f} MB/s), {requests_total} requests, {retries} retries"
+                + (f" | avg {timings}" if timings else "") + (f" | busy {busy}" if busy else ""))
+
+
+class RequestScheduler:
+    """
+    shared by all requests to the moodle server: limits how many of them run at the same time and retries
+    failed ones with exponential backoff and jitter
+    the limit adapts AIMD style like tcp congestion control: every healthy response raises it by 1 / limit
+    (about one per window of requests), 429 / 5xx responses, connection errors and a latency rising above
+    LATENCY_FACTOR times the best seen latency halve it, at most once per round trip
+    a Retry-After header pauses all requests, not just the one that got it
+    downloads hold their slot until the body is read, so they never take the last PAGE_SLOTS slots and a
+    page fetch that waits for a slot goes first, the crawl keeps finding files while downloads fill the limit
+    request_async and retry_async do the same for aiohttp requests on an event loop, both engines share the limit
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    LATENCY_FACTOR = 2
+    LATENCY_SLACK = 0.1  # seconds, latency below best latency + slack never counts as congestion
+    MAX_RETRY_AFTER = 300
+    PAGE_SLOTS = 1
+
+    def __init__(self, max_concurrency, min_concurrency=1, adaptive=True, max_attempts=4, backoff=0.5,
+                 max_backoff=30, metrics=None):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = max(min(min_concurrency, self.max_concurrency), 1)
+        self.adaptive = adaptive
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics or Metrics()
+        self.condition = threading.Condition()
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.downloads = 0
+        self.waiting_pages = 0
+        self.paused_until = 0
+        self.held = False
+        self.latency = None
+        self.best_latency = None
+        self.last_decrease = 0
+        # futures of coroutines waiting for a slot, with the loop they wait on
+        self.async_waiters = []
+        self.metrics.set_gauge("concurrency_limit", self.max_concurrency)
+
+    def _acquire(self, download=False):
+        with self.condition:
+            if not download:
+                self.waiting_pages += 1
+            try:
+                while True:
+                    pause = self.paused_until - time.monotonic()
+                    if pause <= 0 and not self.held and self._has_slot(download):
+                        self.in_flight += 1
+                        self.downloads += download
+                        return
+                    self.condition.wait(pause if pause > 0 else None)
+            finally:
+                if not download:
+                    self.waiting_pages -= 1
+
+    async def _acquire_async(self, download=False):
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if not download:
+                self.waiting_pages += 1
+        try:
+            while True:
+                with self.condition:
+                    pause = self.paused_until - time.monotonic()
+                    if pause <= 0 and not self.held and self._has_slot(download):
+                        self.in_flight += 1
+                        self.downloads += download
+                        return
+                    waiter = loop.create_future()
+                    self.async_waiters.append((loop, waiter))
+                try:
+                    await asyncio.wait_for(waiter, pause if pause > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self.condition:
+                        if (loop, waiter) in self.async_waiters:
+                            self.async_waiters.remove((loop, waiter))
+        finally:
+            if not download:
+                with self.condition:
+                    self.waiting_pages -= 1
+                    self._notify()
+
+    def _notify(self):
+        """wakes the threads and coroutines waiting for a slot, the condition has to be held"""
+        self.condition.notify_all()
+        for loop, waiter in self.async_waiters:
+            loop.call_soon_threadsafe(self._wake, waiter)
+        self.async_waiters.clear()
+
+    @staticmethod
+    def _wake(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _has_slot(self, download):
+        limit = int(self.limit)
+        if not download:
+            return self.in_flight < limit
+        # with a limit of 1 downloads still run, they only wait for page fetches
+        return self.in_flight < limit and not self.waiting_pages and \
+            self.downloads < max(limit - self.PAGE_SLOTS, 1)
+
+    def _release(self, latency=None, congested=False, download=False):
+        with self.condition:
+            self.in_flight -= 1
+            self.downloads -= download
+            if self.adaptive:
+                self._adapt(latency, congested)
+            self._notify()
+
+    def _adapt(self, latency, congested):
+        now = time.monotonic()
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            # the best latency slowly drifts up, so a server that got slower for good is accepted after a while
+            self.best_latency = self.latency if self.best_latency is None \
+                else min(self.latency, self.best_latency * 1.001)
+            if self.latency > max(self.LATENCY_FACTOR * self.best_latency, self.best_latency + self.LATENCY_SLACK):
+                congested = True
+        if congested:
+            if now - self.last_decrease > (self.latency or 0):
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self.last_decrease = now
+                logger.debug(f"server congested, lowering concurrency to {int(self.limit)}")
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self.metrics.set_gauge("concurrency_limit", int(self.limit))
+
+    @contextmanager
+    def request(self, send, download=False):
+        """
+        sends a request once a slot is free, the slot is held until the with block is left,
+        so the body of a streamed response counts towards the limit as well
+        :param send: function that sends the request and returns the response
+        :param download: the request streams a file, it leaves PAGE_SLOTS slots to page fetches
+        """
+        self._acquire(download)
+        start = time.monotonic()
+        try:
+            response = send()
+        except requests.RequestException as e:
+            self._release(congested=self._is_congestion(e), download=download)
+            raise
+        latency = time.monotonic() - start
+        try:
+            with response:
+                yield response
+        except requests.RequestException as e:
+            self._release(latency, congested=self._is_congestion(e), download=download)
+            raise
+        except BaseException:
+            self._release(latency, download=download)
+            raise
+        self._release(latency, congested=response.status_code in self.RETRY_STATUS, download=download)
+
+    @asynccontextmanager
+    async def request_async(self, send, download=False):
+        """
+        async counterpart of request for aiohttp
+        :param send: function that returns the awaitable of the request, e.g. lambda: session.get(url)
+        :param download: the request streams a file, it leaves PAGE_SLOTS slots to page fetches
+        """
+        await self._acquire_async(download)
+        start = time.monotonic()
+        try:
+            response = await send()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._release(congested=self._is_congestion(e), download=download)
+            raise
+        except BaseException:
+            self._release(download=download)
+            raise
+        latency = time.monotonic() - start
+        try:
+            async with response:
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._release(latency, congested=self._is_congestion(e), download=download)
+            raise
+        except BaseException:
+            self._release(latency, download=download)
+            raise
+        self._release(latency, congested=response.status in self.RETRY_STATUS, download=download)
+
+    def _is_congestion(self, error):
+        """
+        :return: true for the errors of a struggling server: connection errors, timeouts, broken transfers and
+        responses of a RETRY_STATUS, a 403 or 404 says nothing about the load of the server
+        """
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in self.RETRY_STATUS
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                              asyncio.TimeoutError)):
+            return True
+        if aiohttp is None:
+            return False
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.RETRY_STATUS
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+    def retry(self, fn, description=""):
+        """
+        calls fn until it succeeds, at most max_attempts times
+        connection errors, timeouts, broken transfers and HTTPErrors of a RETRY_STATUS are retried
+        :return: the result of fn
+        :raises: the last error if all attempts failed
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return fn()
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    requests.HTTPError) as e:
+                response = getattr(e, "response", None)
+                if isinstance(e, requests.HTTPError) and \
+                        (response is None or response.status_code not in self.RETRY_STATUS):
+                    raise
+                if attempt + 1 == self.max_attempts:
+                    raise
+                time.sleep(self._get_retry_delay(attempt, e, getattr(response, "headers", None), description))
+
+    async def retry_async(self, fn, description=""):
+        """
+        async counterpart of retry, connection errors, timeouts, broken transfers and ClientResponseErrors
+        of a RETRY_STATUS are retried
+        :param fn: coroutine function, awaited once per attempt
+        :return: the result of fn
+        :raises: the last error if all attempts failed
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return await fn()
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, aiohttp.ClientResponseError,
+                    asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status not in self.RETRY_STATUS:
+                    raise
+                if attempt + 1 == self.max_attempts:
+                    raise
+                await asyncio.sleep(self._get_retry_delay(attempt, e, getattr(e, "headers", None), description))
+
+    def _get_retry_delay(self, attempt, error, headers, description):
+        """counts the retry, pauses all requests for a Retry-After header and :return: the backoff in seconds"""
+        self.metrics.count("retries")
+        retry_after = self._get_retry_after(headers)
+        if retry_after is not None:
+            self.pause(retry_after)
+        delay = self.get_backoff(attempt)
+        logger.debug(f"retrying {description} in {delay:.1f}s after: {error}")
+        return delay
+
+    def get_backoff(self, attempt):
+        """full jitter: a random delay up to the exponentially growing cap, so retries do not come in waves"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def pause(self, seconds):
+        """lets no request start for the given seconds"""
+        seconds = min(seconds, self.MAX_RETRY_AFTER)
+        logger.info(f"server asked to retry after {seconds:.0f}s, pausing requests")
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def hold(self):
+        """lets no request start until release_hold, e.g. while logging in again"""
+        with self.condition:
+            self.held = True
+
+    def release_hold(self):
+        with self.condition:
+            self.held = False
+            self._notify()
+
+    @staticmethod
+    def _get_retry_after(headers):
+        """:return: the seconds of a Retry-After header, given as seconds or as http date, None without one"""
+        if headers is None or "Retry-After" not in headers:
+            return None
+        value = headers["Retry-After"].strip()
+        if value.isdigit():
+            return int(value)
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+
+class Stage:
+    """
+    worker pool of one pipeline stage with a bounded queue
+    submit() blocks while the queue is full, so a fast stage can not run arbitrarily far ahead of a slow one
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        # submitted tasks that did not finish yet and the ones of them that are running
+        self.pending = 0
+        self.busy = 0
+
+    def submit(self, fn, *args):
+        self.slots.acquire()
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.pool.submit(self._run, fn, args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _run(self, fn, args):
+        with self.lock:
+            self.busy += 1
+        try:
+            return fn(*args)
+        finally:
+            with self.lock:
+                self.busy -= 1
+
+    def _release(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def load(self):
+        """:return: tuple of queued tasks and the share of busy workers"""
+        with self.lock:
+            return self.pending - self.busy, self.busy / self.workers
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class DirectoryCache:
+    """remembers the directories that exist, so os.makedirs only runs once per directory of a crawl"""
+
+    def __init__(self):
+        self.existing = set()
+        self.lock = threading.Lock()
+
+    def ensure(self, path):
+        if path in self.existing:
+            return
+        os.makedirs(path, exist_ok=True)
+        with self.lock:
+            self.existing.add(path)
+
+
+class DiskWriter:
+    """
+    writer stage of the downloads: open() hands out a DiskFile whose chunks are written by a writer thread,
+    so the download workers keep reading from the network while a slow disk, e.g. a NAS mount, catches up.
+    all chunks of a file go to the same writer thread and are written in order, the queue of every writer
+    thread is bounded, a download only waits for the disk once its writer is queue_size chunks behind
+    :param threads: writer threads, 0 writes in the calling thread
+    :param queue_size: chunks that may wait for a writer thread
+    :param fsync_batch: fsync files before they are closed, a writer thread syncs up to this many closed files
+        together once its queue runs empty, 0 never fsyncs
+    :param metrics: Metrics that time the disk operations as write
+    """
+
+    def __init__(self, threads, queue_size, fsync_batch=0, metrics=None):
+        self.fsync_batch = fsync_batch
+        self.metrics = metrics or Metrics()
+        self.directories = DirectoryCache()
+        self.cancelled = False
+        # released by every writer thread that reached the stop of a cancelling shutdown
+        self.stopped = threading.Semaphore(0)
+        self.queues = [Queue(maxsize=queue_size) for _ in range(threads)]
+        self.threads = [threading.Thread(target=self._run, args=(jobs,), name=f"writer-{index}", daemon=True)
+                        for index, jobs in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def open(self, path, mode="wb"):
+        """opens path for writing, missing directories are created by the writer"""
+        disk_file = self._create(path, mode)
+        disk_file.submit("open")
+        return disk_file
+
+    async def open_async(self, path, mode="wb"):
+        """open() for coroutines, waits for room in the queue of the writer without blocking the event loop"""
+        disk_file = self._create(path, mode)
+        await disk_file.submit_async("open")
+        return disk_file
+
+    def _create(self, path, mode):
+        jobs = self.queues[zlib.crc32(path.encode()) % len(self.queues)] if self.queues else None
+        return DiskFile(self, jobs, path, mode)
+
+    def pending(self):
+        """:return: the chunks waiting for a writer thread"""
+        return sum(jobs.qsize() for jobs in self.queues)
+
+    def _run(self, jobs):
+        # closed files waiting for their fsync
+        syncing = []
+        cancelled = False
+        while True:
+            if syncing:
+                try:
+                    job = jobs.get_nowait()
+                except Empty:
+                    self._sync(syncing)
+                    continue
+            else:
+                job = jobs.get()
+            if job is None:
+                self._sync(syncing)
+                if not self.cancelled:
+                    return
+                # downloads that still run after an interrupt get their files failed instead of a writer that is gone
+                cancelled = True
+                self.stopped.release()
+                continue
+            disk_file, operation, data = job
+            if cancelled:
+                disk_file.error = disk_file.error or Exception(f"disk writer was shut down before {disk_file.path}")
+                self._close(disk_file)
+            elif operation == "close" and self.fsync_batch and disk_file.error is None:
+                syncing.append(disk_file)
+                if len(syncing) >= self.fsync_batch:
+                    self._sync(syncing)
+            else:
+                self.perform(disk_file, operation, data)
+
+    def perform(self, disk_file, operation, data=None):
+        with self.metrics.timer("write"):
+            self._perform(disk_file, operation, data)
+
+    def _perform(self, disk_file, operation, data):
+        try:
+            if operation == "open":
+                self.directories.ensure(os.path.dirname(disk_file.path))
+                disk_file.file = open(disk_file.path, disk_file.mode)
+            elif operation == "write":
+                if disk_file.error is None:
+                    disk_file.file.write(data)
+            else:
+                if self.fsync_batch and disk_file.error is None:
+                    disk_file.file.flush()
+                    os.fsync(disk_file.file.fileno())
+                self._close(disk_file)
+        except Exception as e:
+            disk_file.error = disk_file.error or e
+            if operation == "close":
+                self._close(disk_file)
+
+    def _sync(self, syncing):
+        with self.metrics.timer("write"):
+            self._sync_files(syncing)
+
+    def _sync_files(self, syncing):
+        for disk_file in syncing:
+            try:
+                disk_file.file.flush()
+                os.fsync(disk_file.file.fileno())
+            except OSError as e:
+                disk_file.error = e
+            self._close(disk_file)
+        syncing.clear()
+
+    @staticmethod
+    def _close(disk_file):
+        try:
+            if disk_file.file is not None:
+                disk_file.file.close()
+        except OSError as e:
+            disk_file.error = disk_file.error or e
+        disk_file.closed.set()
+
+    def shutdown(self, cancel=False):
+        """
+        writes all queued chunks and stops the writer threads
+        :param cancel: for an interrupted crawl whose downloads still run, the writer threads stay and fail the
+            files of later chunks, so those downloads stop at their next write() instead of blocking on a full queue
+        """
+        self.cancelled = cancel
+        for jobs in self.queues:
+            jobs.put(None)
+        if not cancel:
+            for thread in self.threads:
+                thread.join()
+            return
+        for _ in self.threads:
+            self.stopped.acquire()
+
+
+class DiskFile:
+    """
+    file of a DiskWriter, write() only queues the chunk and close() waits until the file is written and closed
+    errors of the writer thread are raised by the next write() or by close()
+    """
+
+    def __init__(self, writer, jobs, path, mode):
+        self.writer = writer
+        self.jobs = jobs
+        self.path = path
+        self.mode = mode
+        self.file = None
+        self.error = None
+        self.closed = threading.Event()
+        self.close_submitted = False
+
+    def submit(self, operation, data=None, block=True):
+        """:return: false if the queue of the writer thread is full and block is false"""
+        if self.jobs is None:
+            self.writer.perform(self, operation, data)
+            return True
+        try:
+            self.jobs.put((self, operation, data), block=block)
+        except Full:
+            return False
+        return True
+
+    def write(self, data, block=True):
+        """:return: false if the chunk was not queued because the writer is behind and block is false"""
+        if self.error is not None:
+            raise self.error
+        return self.submit("write", data, block)
+
+    async def submit_async(self, operation, data=None):
+        """submit() for coroutines, without writer threads the operation itself runs in a thread"""
+        if self.jobs is None or not self.submit(operation, data, block=False):
+            await asyncio.to_thread(self.submit, operation, data)
+
+    async def write_async(self, data):
+        """write() for coroutines, waits for room in the queue of the writer without blocking the event loop"""
+        if self.error is not None:
+            raise self.error
+        await self.submit_async("write", data)
+
+    def close(self, raise_error=True):
+        if not self.close_submitted:
+            self.close_submitted = True
+            self.submit("close")
+        self.closed.wait()
+        if raise_error and self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # an error of the download is more interesting than one of the writer
+        self.close(raise_error=exc_type is None)
+
+
+class Frontier:
+    """
+    thread safe set of canonicalized URLs that were already scheduled
+    add() checks and inserts in one step, so two workers finding the same link can not both enqueue it
+    """
+
+    def __init__(self, urls=()):
+        self.lock = threading.Lock()
+        self.seen = {canonicalize_url(url) for url in urls}
+
+    def add(self, url):
+        """:return: True if the URL was not seen before"""
+        key = canonicalize_url(url)
+        with self.lock:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            return True
+
+    def __contains__(self, url):
+        key = canonicalize_url(url)
+        with self.lock:
+            return key in self.seen
+
+    def __len__(self):
+        with self.lock:
+            return len(self.seen)
+
+    def urls(self):
+        with self.lock:
+            return set(self.seen)
+
+
+class CrawlScheduler:
+    """
+    work queue of the crawl that accounts for every target from put() until task_done()
+    get() only reports the end of the crawl once nothing is pending and nothing is running anymore,
+    so the crawl neither idles after the last task nor stops while a slow page is still being parsed
+    targets are handed out in the order of TYPE_PRIORITY, so course discovery is not stuck behind file targets
+    """
+
+    TYPE_PRIORITY = ("base", "course", "file", "download")
+
+    def __init__(self, frontier=None):
+        self.frontier = frontier if frontier is not None else Frontier()
+        self.condition = threading.Condition()
+        self.pending = {target_type: deque() for target_type in self.TYPE_PRIORITY}
+        self.pending_count = 0
+        self.running = {}
+        self.counts = {}
+
+    def _count(self, target_type, state, delta):
+        counts = self.counts.setdefault(target_type, {"pending": 0, "running": 0, "completed": 0})
+        counts[state] += delta
+
+    def put(self, target, force=False):
+        """
+        enqueues a target unless its URL was already scheduled
+        :param force: enqueue even if the URL was seen before, e.g. to retry a target
+        :return: True if the target was enqueued
+        """
+        if not self.frontier.add(target["url"]) and not force:
+            return False
+        with self.condition:
+            self.pending.setdefault(target["type"], deque()).append(target)
+            self.pending_count += 1
+            self._count(target["type"], "pending", 1)
+            self.condition.notify()
+        return True
+
+    def start(self, target):
+        """registers a target that is processed right away without passing the queue"""
+        with self.condition:
+            self.running[id(target)] = target
+            self._count(target["type"], "running", 1)
+
+    def get(self, timeout=None):
+        """
+        takes the next target and marks it as running
+        :param timeout: seconds to wait for a target
+        :return: the next target or None once all work is done
+        :raises Empty: if the timeout passed while other targets are still running
+        """
+        with self.condition:
+            while not self.pending_count and self.running:
+                if not self.condition.wait(timeout):
+                    raise Empty
+            return self._take()
+
+    def get_nowait(self):
+        """:return: the next pending target or None if nothing is pending right now"""
+        with self.condition:
+            return self._take()
+
+    def _take(self):
+        if not self.pending_count:
+            return None
+        target = next(queue for queue in self.pending.values() if queue).popleft()
+        self.pending_count -= 1
+        self._count(target["type"], "pending", -1)
+        self._count(target["type"], "running", 1)
+        self.running[id(target)] = target
+        return target
+
+    def task_done(self, target):
+        with self.condition:
+            self.running.pop(id(target), None)
+            self._count(target["type"], "running", -1)
+            self._count(target["type"], "completed", 1)
+            if not self.running and not self.pending_count:
+                self.condition.notify_all()
+
+    def is_finished(self):
+        with self.condition:
+            return not self.pending_count and not self.running
+
+    def snapshot(self):
+        """:return: tuple of the pending and the running targets"""
+        with self.condition:
+            return [target for queue in self.pending.values() for target in queue], list(self.running.values())
+
+    def stats(self):
+        """:return: dict of target type to its pending, running and completed count"""
+        with self.condition:
+            return {target_type: dict(counts) for target_type, counts in self.counts.items()}
+
+    def format_stats(self):
+        return ", ".join(f"{target_type}: {counts['pending']} pending / {counts['running']} running / "
+                         f"{counts['completed']} completed" for target_type, counts in self.stats().items())
+
+
+class FileTypeFilteredException(Exception):
+    """Raised when the response headers show a file type excluded by FILTER_FILETYPES"""
+
+    def __init__(self, file_type):
+        self.file_type = file_type
+
+
+class WebDriverPool:
+    """
+    bounded pool of reusable webdrivers, every page checks a driver out and back in when it is done
+    drivers are started on demand up to max_size or ahead of time with warm_up(), further checkouts wait until
+    a driver is checked in. session cookies are pushed into a driver once per set_cookies() instead of per page,
+    and drivers are restarted after max_pages pages or once their browser uses more than max_memory_mb
+    """
+
+    def __init__(self, factory, max_size, max_pages=0, max_memory_mb=0):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.idle = deque()
+        # started drivers, None for a slot that is reserved for a driver being started
+        self.drivers = []
+        # per driver: pages served and the cookie version it was synced to
+        self.driver_state = {}
+        self.cookies = []
+        self.cookie_url = None
+        self.cookie_version = 0
+        self.lock = threading.Lock()
+        # notified whenever a driver is checked in or a slot is freed
+        self.available = threading.Condition(self.lock)
+
+    def warm_up(self, count):
+        """starts up to count drivers in parallel and parks them in the pool"""
+        count = min(count, self.max_size - len(self.drivers))
+        if count <= 0:
+            return
+        logger.info(f"starting {count} webdrivers")
+        with ThreadPoolExecutor(max_workers=count) as starter:
+            futures = [starter.submit(self._start_driver) for _ in range(count)]
+        for future in futures:
+            try:
+                driver = future.result()
+            except Exception as e:
+                logger.error(f"failed to warm up webdriver: {e}")
+                continue
+            with self.available:
+                self.idle.append(driver)
+                self.available.notify()
+
+    def set_cookies(self, cookies, url):
+        """
+        stores the session cookies, every driver syncs them once on its next checkout
+        :param cookies: the cookie jar of the requests session
+        :param url: a page on the cookie domain, drivers only accept cookies for the page they are on
+        """
+        with self.lock:
+            self.cookies = [{"name": cookie.name, "value": cookie.value, "path": cookie.path or "/"}
+                            for cookie in cookies]
+            self.cookie_url = url
+            self.cookie_version += 1
+
+    def _start_driver(self):
+        with self.lock:
+            if len(self.drivers) >= self.max_size:
+                raise Exception("webdriver pool is full")
+            # reserve the slot, the driver is started outside of the lock
+            self.drivers.append(None)
+        return self._start_reserved_driver()
+
+    def _start_reserved_driver(self):
+        """starts a driver in a slot that was reserved with a None in drivers"""
+        driver = None
+        try:
+            driver = self.factory()
+        finally:
+            with self.available:
+                self.drivers.remove(None)
+                if driver is not None:
+                    self.drivers.append(driver)
+                    self.driver_state[id(driver)] = {"pages": 0, "cookie_version": 0}
+                else:
+                    # the slot is free again, a waiting checkout may start the next driver
+                    self.available.notify()
+        if driver is None:
+            raise Exception("could not start a webdriver")
+        return driver
+
+    def checkout(self, timeout=None):
+        """
+        takes an idle driver, starts a new one if the pool has a free slot or waits for either
+        :raises Empty: if no driver became available within timeout seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.available:
+            while not self.idle and len(self.drivers) >= self.max_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self.available.wait(remaining)
+            if self.idle:
+                driver = self.idle.popleft()
+            else:
+                # reserved under the same lock the free slot was found with
+                self.drivers.append(None)
+                driver = None
+        if driver is None:
+            driver = self._start_reserved_driver()
+        self._sync_cookies(driver)
+        return driver
+
+    def _sync_cookies(self, driver):
+        with self.lock:
+            state = self.driver_state[id(driver)]
+            if state["cookie_version"] == self.cookie_version:
+                return
+            version, cookies, url = self.cookie_version, list(self.cookies), self.cookie_url
+        driver.get(url)
+        driver.delete_all_cookies()
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+        state["cookie_version"] = version
+
+    def checkin(self, driver):
+        state = self.driver_state[id(driver)]
+        state["pages"] += 1
+        if self.max_pages and state["pages"] >= self.max_pages:
+            logger.debug(f"recycling webdriver after {state['pages']} pages")
+            self.discard(driver)
+        elif self.max_memory_mb and self._memory_mb(driver) > self.max_memory_mb:
+            logger.debug("recycling webdriver because of its memory usage")
+            self.discard(driver)
+        else:
+            with self.available:
+                self.idle.append(driver)
+                self.available.notify()
+
+    @staticmethod
+    def _memory_mb(driver):
+        """:return: resident memory of the browser processes behind a driver, 0 if unknown"""
+        if psutil is None:
+            return 0
+        try:
+            process = psutil.Process(driver.service.process.pid)
+            return sum(child.memory_info().rss for child in process.children(recursive=True)) / 1024 ** 2
+        except Exception:
+            return 0
+
+    def discard(self, driver):
+        """quits a driver and frees its slot for a new one"""
+        with self.available:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+            self.driver_state.pop(id(driver), None)
+            # a checkout waiting for a driver can start one in the freed slot
+            self.available.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"failed to quit webdriver: {e}")
+
+    @contextmanager
+    def driver(self, timeout=None):
+        driver = self.checkout(timeout=timeout)
+        try:
+            yield driver
+        except BaseException:
+            self.discard(driver)
+            raise
+        else:
+            self.checkin(driver)
+
+    def shutdown(self):
+        with self.lock:
+            drivers = [driver for driver in self.drivers if driver is not None]
+            self.drivers = []
+            self.driver_state = {}
+            self.idle.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug(f"failed to quit webdriver: {e}")
+
+
+class SoupChef:
+    """
+    fetches pages and cooks them into soups, all calls return their soup instead of storing it,
+    so one SoupChef can be shared by all worker threads, dynamic pages borrow a driver from the WebDriverPool
+    """
+
+    def __init__(self, driverConfig=None, metrics=None, scheduler=None):
+        self.metrics = metrics or Metrics()
+        if driverConfig is None:
+            self.config = {
+                "MAX_RETRY": 3,
+                "TIMEOUT": 60,
+                "WEBDRIVER_DIR": "./drivers",
+                "WEBDRIVER_FILE": "chromedriver.exe"
+            }
+        else:
+            self.config = driverConfig
+
+        self.scheduler = scheduler or RequestScheduler(self.config.get("URLLIB_POOLSIZE", 15), adaptive=False,
+                                                       max_attempts=self.config["MAX_RETRY"], metrics=self.metrics)
+        self.driver_pool = WebDriverPool(self._get_webdriver, self.config.get("WEBDRIVER_POOL_SIZE", 1),
+                                         max_pages=self.config.get("WEBDRIVER_MAX_PAGES", 0),
+                                         max_memory_mb=self.config.get("WEBDRIVER_MAX_MEMORY_MB", 0))
+        self.Parser = self.config.get("PARSER", 'html.parser')
+        if builder_registry.lookup(self.Parser) is None:
+            logger.warning(f"parser {self.Parser} is not installed, falling back to html.parser")
+            self.Parser = 'html.parser'
+        self.partial_parsing = self.Parser not in PARSERS_WITHOUT_PARSE_ONLY
+
+    def _get_webdriver(self):
+        """
+        returns a webdriver for selenium
+        expects you to have the file in a directory named after your os (linux / windows / if you use mac, go buy linux)
+        https://www.makeuseof.com/how-to-install-selenium-webdriver-on-any-computer-with-python/
+        """
+        path = None
+        try:
+            driver_options = Options()
+            # driver_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+            # trying to block logging from webdriver as it spams the log unnecessarily
+            driver_options.headless = True
+            block_resources = self.config.get("WEBDRIVER_BLOCK_RESOURCES", False)
+            if block_resources:
+                # images are blocked by the content settings, stylesheets and fonts by url further down
+                driver_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+            if os.name == 'posix':
+                path = os.path.join(self.config["WEBDRIVER_DIR"], "linux", self.config["WEBDRIVER_FILE"])
+                ser = Service(path)
+                driver = webdriver.Chrome(service=ser, options=driver_options, service_log_path='/dev/null')
+            else:
+                path = os.path.join(self.config["WEBDRIVER_DIR"], "windows", self.config["WEBDRIVER_FILE"])
+                ser = Service(path)
+                driver = webdriver.Chrome(service=ser, options=driver_options, service_log_path='NUL')
+
+            if block_resources:
+                driver.execute_cdp_cmd("Network.enable", {})
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_BROWSER_RESOURCES})
+            return driver
+
+        except Exception as e:
+            logger.error("failed to initialize webdriver for selenium, /"
+                         "make sure you downloaded a driver and wrote the correct path to config, /"
+                         "current path: " + path)
+            logger.error(e)
+
+    def get_soup_from_URL(self, URL, session=None, dynamic=False, parse_only=None):
+        if dynamic:
+            return self._get_soup_of_dynamic_page(URL, session=session, parse_only=parse_only)
+        return self._get_soup_of_static_page(URL, session=session, parse_only=parse_only)
+
+    def get_soup_from_text(self, text, parse_only=None):
+        with self.metrics.timer("parse"):
+            soup = BeautifulSoup(text, self.Parser, parse_only=parse_only if self.partial_parsing else None)
+        self.metrics.count("pages")
+        return soup
+
+    def get_content_from_URL(self, URL, session=None):
+        """
+        fetches a static page without parsing it
+        :param URL: the URL to fetch
+        :return: the raw bytes of the page or None if it could not be fetched
+        :raises RedirectException: if the page is a forced download
+        :raises SessionExpiredException: if moodle answered with the login page
+        """
+        page = self.get_page(URL, session)
+        return None if page is None else page.content
+
+    def get_page(self, URL, session=None, headers=None):
+        """
+        fetches a static page without parsing it
+        :param URL: the URL to fetch
+        :param headers: additional request headers, e.g. conditional headers
+        :return: the response with its body read, None if the page could not be fetched
+        :raises RedirectException: if the page is a forced download
+        :raises SessionExpiredException: if moodle answered with the login page
+        """
+        get = requests.get if session is None else session.get
+
+        def fetch():
+            with self.scheduler.request(lambda: get(URL, headers=headers, timeout=self.config["TIMEOUT"],
+                                                    allow_redirects=False)) as response:
+                if response.status_code in RequestScheduler.RETRY_STATUS:
+                    response.raise_for_status()
+                # read the body while the request still holds its slot
+                response.content
+                return response
+
+        try:
+            with self.metrics.timer("fetch"):
+                page = self.scheduler.retry(fetch, URL)
+        except requests.RequestException as e:
+            logger.error(f"request unable to get {URL}: {e}")
+            return None
+
+        if is_login_url(page.url) or is_login_url(page.headers.get("Location")) or LOGIN_FORM_MARKER in page.content:
+            raise SessionExpiredException(URL)
+        if page.status_code == 303:
+            logger.debug("request got redirected: " + URL + " to " + page.url)
+            # this means the file is a forced download, so we can't scrape the page
+            raise RedirectException(page.headers["Location"])
+        return page
+
+    def _get_soup_of_static_page(self, URL, session=None, parse_only=None):
+        """
+        parses the given URL and returns the soup
+        object of a static loaded page
+        :param URL: the URL to parse
+        :param parse_only: SoupStrainer to only build parts of the page (ignored by html5lib)
+        :return: the soup object
+        """
+        content = self.get_content_from_URL(URL, session)
+        if content is None:
+            return None
+
+        soup = self.get_soup_from_text(content, parse_only=parse_only)
+
+        if soup is None:
+            logger.error("No soup could be cooked for" + URL + " !")
+
+        return soup
+
+    def _get_soup_of_dynamic_page(self, URL, session=None, parse_only=None):
+        """
+        parses the given URL and returns the soup
+        object of a dynamic loaded page
+        :param URL: the URL to parse
+        :param parse_only: SoupStrainer to only build parts of the page (ignored by html5lib)
+        :return: the soup object
+        """
+        if session is not None and not self.driver_pool.cookie_version:
+            # nobody synced the session yet, the drivers take the cookies once instead of on every page
+            self.driver_pool.set_cookies(session.cookies, URL)
+
+        page = None
+        with self.driver_pool.driver() as driver:
+            for attempt in range(self.config["MAX_RETRY"]):
+                try:
+                    with self.metrics.timer("fetch"):
+                        driver.get(URL)
+                        # time.sleep(1)  # load page
+                        page = driver.page_source
+                    if is_login_url(driver.current_url):
+                        raise SessionExpiredException(URL)
+                    break
+
+                except SessionExpiredException:
+                    raise
+
+                except Exception as e:
+                    if attempt + 1 == self.config["MAX_RETRY"]:
+                        logger.error(f"chromeDriver unable to get {URL}: {e}")
+                        return None
+                    self.metrics.count("retries")
+                    time.sleep(self.scheduler.get_backoff(attempt))
+
+        soup = self.get_soup_from_text(page, parse_only=parse_only)
+
+        if soup is None:
+            logger.error("No soup could be cooked for" + URL + " !")
+
+        return soup
+
+    def shutdown(self):
+        if self.driver_pool.drivers:
+            logger.info("shutting down webdrivers")
+        self.driver_pool.shutdown()
+
+
+class Kraken:
+
+    def __init__(self, scraping_config, resume=False, courses=None, cookie_file=None):
+        """
+        :param courses: course URLs to crawl instead of all courses of the course list, e.g. of a shard
+        :param cookie_file: cookies of a login shared by the shards of a crawl, used instead of logging in
+        """
+        self.config = scraping_config
+        self.visited = Frontier()
+        self.to_visit = CrawlScheduler(self.visited)
+        if courses is None:
+            self.to_visit.put({"url": self.config.BASE_URL, "type": "base"})
+        else:
+            for course in courses:
+                self.to_visit.put({"url": course, "type": "course"})
+        self.cookie_file = cookie_file
+        self.filetype_filter = FileTypeFilter(self.config.FILTER_FILETYPES)
+        self.course_filter = CourseFilter(self.config.FILTER_COURSES)
+        # course name to FilterDecision, to audit why a course was crawled or skipped
+        self.filter_decisions = {}
+        # resolved file URLs, several resource pages can point to the same file
+        self.downloads = Frontier()
+        self.files = Queue()
+        self.domain = urlsplit(self.config.BASE_URL).netloc
+        self.link_classifier = LinkClassifier(self.config.LINK_MODULES, self.domain)
+        self.stages = {name: Stage(name, workers, self.config.STAGE_QUEUE_SIZE)
+                       for name, workers in self.config.STAGE_THREADS.items()}
+        self.session = None
+        self.manifest = Manifest(self.config.MANIFEST_FILE or
+                                 os.path.join(self.config.DOWNLOAD_PATH, ".kraken_manifest.jsonl"))
+        self.checkpoint = Checkpoint(self.config.CHECKPOINT_FILE or
+                                     os.path.join(self.config.DOWNLOAD_PATH, ".kraken_checkpoint.json"))
+        self.checkpoint_lock = threading.Lock()
+        self.extraction_cache = None
+        if self.config.EXTRACTION_CACHE_SIZE:
+            self.extraction_cache = ExtractionCache(
+                self.config.EXTRACTION_CACHE_FILE or os.path.join(self.config.DOWNLOAD_PATH,
+                                                                  ".kraken_extraction_cache.json"),
+                self.config.EXTRACTION_CACHE_SIZE)
+        self.partial_downloads = {}
+        # targets that could not be crawled without a session, see _park_target
+        self.parked_targets = []
+        self.metrics = Metrics()
+        self.disk_writer = DiskWriter(self.config.WRITER_THREADS, self.config.WRITER_QUEUE_SIZE,
+                                      self.config.WRITER_FSYNC_BATCH, metrics=self.metrics)
+        self.last_checkpoint = time.monotonic()
+        self.last_progress = time.monotonic()
+        # renewed sessions, a worker only logs in again if nobody renewed the session it failed with
+        self.session_generation = 0
+        self.login_lock = threading.Lock()
+        self.login_failed = False
+        self.request_scheduler = RequestScheduler(
+            self._get_request_limit(),
+            min_concurrency=self.config.MIN_CONCURRENCY, adaptive=self.config.ADAPTIVE_CONCURRENCY,
+            max_attempts=self.config.MAX_RETRY, backoff=self.config.RETRY_BACKOFF,
+            max_backoff=self.config.RETRY_BACKOFF_MAX, metrics=self.metrics)
+        if resume:
+            self._restore_checkpoint()
+        self.soupChef = SoupChef({"MAX_RETRY": scraping_config.MAX_RETRY, "TIMEOUT": scraping_config.TIMEOUT,
+                                  "WEBDRIVER_DIR": scraping_config.WEBDRIVER_DIR,
+                                  "WEBDRIVER_FILE": scraping_config.WEBDRIVER_FILE, "PARSER": scraping_config.PARSER,
+                                  "WEBDRIVER_POOL_SIZE": scraping_config.WEBDRIVER_POOL_SIZE,
+                                  "WEBDRIVER_MAX_PAGES": scraping_config.WEBDRIVER_MAX_PAGES,
+                                  "WEBDRIVER_MAX_MEMORY_MB": scraping_config.WEBDRIVER_MAX_MEMORY_MB,
+                                  "WEBDRIVER_BLOCK_RESOURCES": scraping_config.WEBDRIVER_BLOCK_RESOURCES},
+                                 metrics=self.metrics, scheduler=self.request_scheduler)
+        partial_parsing = self.config.PARTIAL_PARSING and self.soupChef.partial_parsing
+        self.strainers = {"course": COURSEPAGE_STRAINER, "file": FILEPAGE_STRAINER, "folder": FILEPAGE_STRAINER} \
+            if partial_parsing else {}
+        self.parse_pool = None
+        if self.config.PARSE_PROCESSES:
+            # spawn instead of fork, the processes start on the first page while other threads hold locks
+            self.parse_pool = ProcessPoolExecutor(self.config.PARSE_PROCESSES,
+                                                  mp_context=multiprocessing.get_context("spawn"),
+                                                  initializer=_init_parse_worker,
+                                                  initargs=(self.soupChef.Parser, partial_parsing,
+                                                            self.config.LINK_MODULES, self.domain))
+        # the course list of the remui theme, served by the same host as BASE_URL
+        base = urlsplit(self.config.BASE_URL)
+        self.ajaxCalls = (
+            f'{base.scheme}://{base.netloc}/theme/remui/request_handler.php?action=get_courses_ajax&wdmdata={{'
+            '%22category%22:%22all%22,%22sort%22:null,%22search%22:%22%22,%22tab%22:true,%22page%22:{%22courses%22:0,'
+            '%22mycourses%22:%22 ',
+            '%22},%22pagination%22:true,%22view%22:%22grid%22,%22isFilterModified%22:true}')
+
+    def _get_request_limit(self):
+        """:return: the most requests the RequestScheduler lets run at the same time"""
+        return self.config.URLLIB_POOLSIZE or sum(self.config.STAGE_THREADS.values())
+
+    def run(self):
+        # first login to get the session cookies and then start the scraping with a session for every thread with
+        # saved cookies
+        self._warm_up_webdrivers()
+        self._init_session()
+        self._log_in()
+
+        while True:
+            try:
+                # wake up regularly to write checkpoints and report progress while workers are busy
+                target = self.to_visit.get(timeout=1)
+                if target is None:
+                    self._shutdown()
+                    self._finish_checkpoint()
+                    break
+                self._dispatch(target)
+                #self.scrape(target)
+                self._maybe_write_checkpoint()
+                self._maybe_report_progress()
+
+            except Empty:
+                self._maybe_write_checkpoint()
+                self._maybe_report_progress()
+            except KeyboardInterrupt:
+                logger.warning("interrupted, writing checkpoint - continue with --resume")
+                self._write_checkpoint()
+                for stage in self.stages.values():
+                    stage.shutdown(wait=False, cancel_futures=True)
+                if self.parse_pool is not None:
+                    self.parse_pool.shutdown(wait=False, cancel_futures=True)
+                self.soupChef.shutdown()
+                self.disk_writer.shutdown(cancel=True)
+                self.manifest.compact()
+                self._save_extraction_cache()
+                return
+            except Exception as e:
+                print(e)
+                logger.error(e)
+                self._write_checkpoint()
+                break
+
+        logger.info("finished scraping")
+        logger.info(f"visited: {len(self.visited)}")
+        logger.info(self.to_visit.format_stats())
+        self._report_metrics()
+
+    def _dispatch(self, target):
+        if target["type"] == "download":
+            self.stages["download"].submit(self._save_file_tracked, target)
+        elif target["type"] == "file":
+            self.stages["resolve"].submit(self._scrape_tracked, target)
+        else:
+            self.stages["discovery"].submit(self._scrape_tracked, target)
+
+    def _scrape_tracked(self, target):
+        generation = self.session_generation
+        try:
+            self.scrape(target)
+        except SessionExpiredException as e:
+            self._handle_expired_session(target, generation, e)
+        finally:
+            self.to_visit.task_done(target)
+
+    def _save_file_tracked(self, target):
+        generation = self.session_generation
+        try:
+            with self.metrics.timer("download"):
+                self.save_file(target)
+        except SessionExpiredException as e:
+            self._handle_expired_session(target, generation, e)
+        finally:
+            self.to_visit.task_done(target)
+
+    def _handle_expired_session(self, target, generation, error):
+        """logs in again and requeues the target that got the login page instead of its content"""
+        logger.debug(error)
+        self.metrics.count("session_expired")
+        if not self._renew_session(generation):
+            self._park_target(target)
+            return
+        # a copy, the scheduler tracks running targets by id and the finally of the worker still marks this one done
+        self.to_visit.put(dict(target), force=True)
+
+    def _park_target(self, target):
+        """keeps a target that failed because logging in again failed, the checkpoint holds it for --resume"""
+        logger.error(f"parking {target['url']} until --resume, logging in again failed")
+        with self.checkpoint_lock:
+            self.parked_targets.append(dict(target))
+
+    def _renew_session(self, generation):
+        """
+        single flight re-login: the first worker that notices the expired session logs in again, while
+        the request scheduler holds back all other requests, workers that failed with the same session
+        only wait for the new one
+        :param generation: the session_generation the failed request was sent with
+        :return: true if there is a valid session
+        """
+        with self.login_lock:
+            if self.session_generation != generation:
+                return not self.login_failed
+            logger.warning("session expired, logging in again")
+            self.request_scheduler.hold()
+            try:
+                self.session.cookies.clear()
+                self.login_failed = not self._do_login()
+            except Exception as e:
+                logger.error(f"failed to log in again: {e}")
+                self.login_failed = True
+            finally:
+                self.session_generation += 1
+                self.request_scheduler.release_hold()
+            return not self.login_failed
+
+    def _schedule_download(self, param):
+        """
+        hands a resolved file to the download stage, the resolving worker blocks while the download queue is full
+        the download is registered with the scheduler first, so the crawl can not end before it is saved
+        """
+        target = {"type": "download", "url": param["file_url"], **param}
+        self.to_visit.start(target)
+        try:
+            self.stages["download"].submit(self._save_file_tracked, target)
+        except BaseException:
+            self.to_visit.task_done(target)
+            raise
+
+    def _maybe_report_progress(self):
+        if self.config.PROGRESS_INTERVAL <= 0:
+            return
+        if time.monotonic() - self.last_progress >= self.config.PROGRESS_INTERVAL:
+            logger.info(self.to_visit.format_stats())
+            self._report_metrics()
+            self.last_progress = time.monotonic()
+
+    def _update_gauges(self):
+        for target_type, counts in self.to_visit.stats().items():
+            self.metrics.set_gauge("queue_depth", counts["pending"], label=target_type)
+        for name, stage in self.stages.items():
+            queued, utilization = stage.load()
+            self.metrics.set_gauge("stage_queue_depth", queued, label=name)
+            self.metrics.set_gauge("worker_utilization", utilization, label=name)
+        self.metrics.set_gauge("writer_queue_depth", self.disk_writer.pending())
+
+    def _report_metrics(self):
+        self._update_gauges()
+        logger.info(self.metrics.progress_line())
+        if self.config.METRICS_FILE:
+            try:
+                self.metrics.write(self.config.METRICS_FILE)
+            except OSError as e:
+                logger.error(f"failed to write metrics {self.config.METRICS_FILE}: {e}")
+
+    def _maybe_write_checkpoint(self):
+        if self.config.CHECKPOINT_INTERVAL <= 0:
+            return
+        if time.monotonic() - self.last_checkpoint >= self.config.CHECKPOINT_INTERVAL:
+            self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        pending, in_flight = self.to_visit.snapshot()
+        with self.checkpoint_lock:
+            pending += self.parked_targets
+            partial_downloads = dict(self.partial_downloads)
+        try:
+            self.checkpoint.save(pending, self.visited.urls(), in_flight, partial_downloads)
+        except OSError as e:
+            logger.error(f"failed to write checkpoint {self.checkpoint.path}: {e}")
+        self.last_checkpoint = time.monotonic()
+        logger.debug(f"wrote checkpoint with {len(pending) + len(in_flight)} open targets")
+
+    def _finish_checkpoint(self):
+        """removes the checkpoint of a finished crawl, keeps one with the parked targets if there are any"""
+        if not self.parked_targets:
+            self.checkpoint.remove()
+            return
+        self._write_checkpoint()
+        logger.warning(f"{len(self.parked_targets)} targets are parked until a login works - continue with --resume")
+
+    def _restore_checkpoint(self):
+        if not self.checkpoint.exists():
+            logger.warning(f"no checkpoint found at {self.checkpoint.path}, starting a fresh crawl")
             return
-        courses.extend(requested_courses)
-        index += 1
+        state = self.checkpoint.load()
+        self.visited = Frontier(state["visited"])
+        self.to_visit = CrawlScheduler(self.visited)
+        open_targets = state["in_flight"] + state["pending"]
+        for target in open_targets:
+            # open targets are part of the visited urls, but have to be scraped again
+            self.to_visit.put(target, force=True)
+        self.partial_downloads = state.get("partial_downloads", {})
+        logger.info(f"resuming crawl with {len(open_targets)} open targets and {len(self.visited)} visited urls")
 
-        if "pagination" in content:
-            maxIndex = max(map(int, re.findall("page=(\d)", content["pagination"])))
+    def scrape(self, target):
+        url = target["url"]
+
+        if self._is_relative_URL(url):
+            source_URL = self.config.BASE_URL + url
         else:
-            maxIndex = 0
+            source_URL = url
+
+        try:
+            if target["type"] == "base":
+                # course pages are scraped while the remaining course list pages are still loading
+                for courses in self._iter_course_pages():
+                    for course in self._filter(courses):
+                        self.to_visit.put({"url": course, "type": "course"})
+
+            elif target["type"] == "course":
+                self.parse_coursepage(source_URL)
+
+            elif target.get("link_type") == LinkType.FOLDER.value and self.config.FOLDER_MODE != "zip":
+                with self.metrics.timer("resolve"):
+                    folder = self.parse_folderpage(source_URL)
+                for param in self._plan_folder_downloads(folder, target):
+                    if self._is_new_download(param["file_url"]):
+                        self._schedule_download(param)
 
-        while index <= maxIndex:
-            response = self.session.get(self.ajaxCalls[0] + str(index) + self.ajaxCalls[1])
-            if response.status_code == 200:
-                logger.info(f"ajax call (nr: {index}) successful - received {len(response.json()['courses'])} courses")
             else:
-                logger.error(f"ajax call (nr: {index}) failed")
+                if target["name"] == "404":
+                    print("hi 404")
+                with self.metrics.timer("resolve"):
+                    file_name, file_url = self.parse_filepage(source_URL, target.get("link_type"))
+                if file_name is not None and file_url is not None:
+                    if not self._is_new_download(file_url):
+                        return
+                    self._schedule_download({"file_name": file_name, "file_url": file_url,
+                                             "folder_name": target["block"], "course_name": target["course"]})
 
-            requested_courses = response.json()["courses"]
-            if len(requested_courses) == 0:
-                logger.error("no courses received during ajax call (nr: {index})")
-                return
+        except SessionExpiredException:
+            raise
+        except Exception as e:
+            logger.error(e)
+            print(e)
+
+    def _log_in(self):
+        """reuses the cookies of a shared login if there are any, logs in otherwise"""
+        if self.cookie_file and os.path.exists(self.cookie_file):
+            self._load_cookies(self.cookie_file)
+            self.soupChef.driver_pool.set_cookies(self.session.cookies, self.config.BASE_URL)
+            logger.info(f"reusing the login of {self.cookie_file}")
+            return
+        self._do_login()
+
+    def _save_cookies(self, path):
+        cookies = [{"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path}
+                   for cookie in self.session.cookies]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cookies, f)
+        os.replace(tmp_path, path)
+
+    def _load_cookies(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            for cookie in json.load(f):
+                self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"],
+                                         path=cookie["path"])
+
+    def _do_login(self):
+        flag = load_dotenv(self.config.CREDENTIALS)
+        if not flag:
+            raise Exception("Credentials file not found")
+
+        logger.info("successfully loaded credentials-file")
+        # the form and its token are fetched again for every attempt
+        return self.request_scheduler.retry(self._submit_login, "login")
+
+    def _submit_login(self):
+        form_data = self._get_form_data(self.config.BASE_URL)  # 'https://elearning.fhws.de/login/index.php'
+        # None: an earlier attempt logged in and only the redirect after its post failed
+        if form_data is not None:
+            login_url, token = form_data
+            login_data = {
+                'username': os.environ.get('STUDENT_USER'),
+                'password': os.environ.get('STUDENT_PASSWORD'),
+                'logintoken': token
+            }
+            response = self.session.post(login_url, data=login_data, timeout=self.config.TIMEOUT)
+            if response.status_code in RequestScheduler.RETRY_STATUS:
+                response.raise_for_status()
+            if response.status_code != 200 or is_login_url(response.url):
+                logger.error("login failed")
+                return False
+        logger.info("login successful")
+        self.soupChef.driver_pool.set_cookies(self.session.cookies, self.config.BASE_URL)
+        return True
 
-            courses.extend(requested_courses)
-            index += 1
+    def _warm_up_webdrivers(self):
+        """starts the configured webdrivers in the background, so their cold start overlaps with the login"""
+        if self.config.WEBDRIVER_WARMUP:
+            threading.Thread(target=self.soupChef.driver_pool.warm_up, args=(self.config.WEBDRIVER_WARMUP,),
+                             name="webdriver-warmup", daemon=True).start()
 
+    def _get_courses(self):
+        courses = [course for page in self._iter_course_pages() for course in page]
         logger.info(f"found {len(courses)} courses")
         return courses
 
+    def _iter_course_pages(self):
+        """
+        yields the courses of every page of the course ajax call as soon as the page arrives
+        page 0 tells the number of pages, all further pages are requested concurrently
+        """
+        content = self._get_course_page(0)
+        if len(content["courses"]) == 0:
+            logger.error("no courses received during ajax call")
+            return
+        yield content["courses"]
+
+        maxIndex = self._get_max_page_index(content)
+        if maxIndex == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(maxIndex, self.config.URLLIB_POOLSIZE or 1)) as pool:
+            futures = [pool.submit(self._get_course_page, index) for index in range(1, maxIndex + 1)]
+            for future in as_completed(futures):
+                try:
+                    courses = future.result()["courses"]
+                except SessionExpiredException:
+                    raise
+                except Exception as e:
+                    logger.error(f"ajax call failed: {e}")
+                    continue
+                yield courses
+
+    def _get_course_page(self, index):
+        def fetch():
+            with self.request_scheduler.request(lambda: self.session.get(self._get_course_page_url(index),
+                                                                         timeout=self.config.TIMEOUT)) as response:
+                if response.status_code in RequestScheduler.RETRY_STATUS:
+                    response.raise_for_status()
+                response.content
+                return response
+
+        response = self.request_scheduler.retry(fetch, f"ajax call (nr: {index})")
+        if is_login_url(response.url):
+            raise SessionExpiredException(response.url)
+        if response.status_code != 200:
+            raise Exception(f"ajax call (nr: {index}) failed with status {response.status_code}")
+        content = response.json()
+        logger.info(f"ajax call (nr: {index}) successful - received {len(content['courses'])} courses")
+        if len(content["courses"]) == 0:
+            logger.error(f"no courses received during ajax call (nr: {index})")
+        return content
+
+    def _get_course_page_url(self, index):
+        return self.ajaxCalls[0] + str(index) + self.ajaxCalls[1]
+
+    @staticmethod
+    def _get_max_page_index(content):
+        """:return: the highest page number linked in the pagination html of the first ajax page"""
+        return max(map(int, re.findall(r"page=(\d+)", content.get("pagination") or "")), default=0)
+
     def _get_form_data(self, url):
-        response = self.session.get(url)
+        """:return: tuple of the url and the token of the login form, None if the session is logged in already"""
+        # not scheduled, a re-login runs while the request scheduler holds back all other requests
+        response = self.session.get(url, timeout=self.config.TIMEOUT)
+        if response.status_code in RequestScheduler.RETRY_STATUS:
+            response.raise_for_status()
         soup = self.soupChef.get_soup_from_text(response.text)
-        login_url = soup.find('form', {'id': 'login'})['action']
+        form = soup.find('form', {'id': 'login'})
+        if form is None:
+            if response.status_code == 200 and not is_login_url(response.url):
+                return None
+            raise Exception(f"no login form at {response.url}")
+        login_url = form['action']
         token = soup.find('input', {'name': 'logintoken'})['value']
         return login_url, token
 
@@ -423,157 +2944,188 @@ class Kraken:
         return not bool(re.search("^http", URL))
 
     def parse_coursepage(self, source_URL):
-        soup = self.soupChef.get_soup_from_URL(source_URL, self.session)
-        if soup is None:
-            return
-
-        course_name = soup.select_one("h1").text.strip()
-
-        # is this a special course with tiles?
-        is_existing = soup.select_one("div#card-container")
-        if is_existing is not None:
-            logger.debug(f"found special course {course_name}")
-            courses = soup.select("li.section a[href*='course']")
-            courses = [course["href"] for course in courses]
-            for course in courses:
-                if course not in self.visited:
-                    self.to_visit.put({"url": course, "type": "course"})
-            return
-
-        # find all blocks on the page
-        blocks = soup.select("li.section")
-        if blocks is None:
-            logger.error(f"no blocks found on {source_URL}")
+        targets = self._extract_page("course", source_URL)
+        if targets is None:
             return
 
-        flag = True
-
-        # iterate over all blocks
-        for block in blocks:
-            # find name of the block (e.g. "Lernmaterialien")
-            block_name = block.select_one("h4 > a")
-            if block_name is None:
-                block_name = block.select_one("h4 div")
-                if block_name is None:
-                    #  logger.error(f"no block name found on {source_URL}")
-                    continue
-            if "&section" in source_URL:
-                block_name = block.select_one("h2.section-title")
-
-            block_name = block_name.text.strip()
-            # for each block, find all links
-            # links = self._filter(block.select("a[href]"))
-            links = block.select("a:not([href^='#'])")
-            # names = block.select("a[onclick] > span")
-            names = []
-            for link in links:
-                try:
-                    if len(link.contents) == 1 and isinstance(link.contents[0], NavigableString):
-                        names.append(link.contents[0].strip())
-                    else:
-                        tag = link.select_one("span:not(.fp-icon)")
-                        if tag is not None:
-                            names.append(tag.contents[0].strip())
-                        else:
-                            names.append("404")
-                except Exception as e:
-                    logger.error(f"error while parsing block {block_name} of course {course_name}: {e}")
-
-            if len(links) == 0:
-                #logger.warning(f"no links found in block {block_name} of course {course_name} on {source_URL}")
+        new_links = False
+        for target in targets:
+            if not self._is_wanted_target(target):
                 continue
+            if self.to_visit.put(target):
+                new_links = True
 
-            # iterate over all links
-            for idx, elem in enumerate(links):
-                try:
-                    name = names[idx]
-                except IndexError as e:
-                    name = "404"
-                    logger.error(f"no name found for link {elem['href']} in block {block_name} of course {course_name}")
-                link = elem["href"]
-                # TODO filter redirects
-                # TODO make constants
-                # TODO beautify
-                if "questionnaire" in link or "forum" in link or "groupselect" in link \
-                        or "assign" in link or "page" in link or "workshop" in link or "data" in link or "user" in link \
-                        or "quiz" in link or "feedback" in link or "choicegroup" in link or "choice" in link \
-                        or "evaluation" in link or "scorm" in link or "lesson" in link or "lightboxgallery" in link \
-                        or "glossary" in link or "chat" in link or "#" in link or "mailto" in link:
-                    continue
-
-                #if "url" in link:
-                    #logger.debug(f"{link} is type url")
-
-                if link not in self.visited:
-                    self.to_visit.put(
-                        {"type": "file", "url": link, "name": name, "block": block_name, "course": course_name})
-                    flag = False
-
-            logger.debug(f"found {len(links)} links in block {block_name} of course {course_name}")
-
-        if flag:
-            logger.warning(f"no new links found in course {course_name} {source_URL}")
+        if not new_links:
+            logger.warning(f"no new links found in course {source_URL}")
 
-    def parse_filepage(self, source_URL):
+    def parse_filepage(self, source_URL, link_type=None):
         fileName, fileURL = None, None
         try:
             if self.domain != urlparse(source_URL).netloc:
                 logger.debug(f"skipping {source_URL} because it is not on the same domain")
                 return fileName, fileURL
 
-            pathEnding = os.path.splitext(source_URL)[-1]
-            if pathEnding != "" and not pathEnding.startswith(".php"):
-                # is file url
-                fileName = os.path.basename(urlparse(source_URL).path)
-                fileURL = source_URL
-                return fileName, fileURL
+            direct_file = self._get_direct_file(source_URL)
+            if direct_file is not None:
+                return self._filter_file_type(*direct_file)
 
-            soup = self.soupChef.get_soup_from_URL(source_URL, self.session)
-            if soup is None:
+            result = self._extract_page("file", source_URL, link_type)
+            if result is None:
                 return fileName, fileURL
-
-            is_folder = bool(re.search("folder", source_URL))
-
-            if is_folder:
-                # file name
-                fileName = soup.select_one("h2").text.strip().replace("/", "_")
-                # find form data
-                form_tag = soup.select_one("form:not([id])[method=post]")
-                method = form_tag["method"]
-                action = form_tag["action"]
-                value = soup.select_one("input[name=id]")["value"]
-                fileURL = action + "?id=" + value
-
-            else:
-                # find data link
-                tag = soup.select_one(".resourceworkaround a[onclick], .urlworkaround a")
-                if tag is None:
-                    # TODO beautify
-                    # may be a embedded pdf file like in "https://elearning.fhws.de/mod/resource/view.php?id=681498"
-                    # could also be embedded image like in https://elearning.fhws.de/mod/resource/view.php?id=686598
-                    tag = soup.select_one("object a")
-                if tag is None:
-                    tag = soup.select_one("img.resourceimage")
-                    fileURL = tag["src"]
-                    fileName = soup.select_one("h2").text.strip()
-                else:
-                    fileURL = tag["href"]
-                    fileName = tag.text
+            fileName, fileURL = result
 
         except RedirectException as e:
             # some resource urls automatically redirect to the file
-            fileURL = e.new_url
-            fileName = unquote(urlparse(e.new_url).path.split("/")[-1])
-            return fileName, fileURL
+            return self._filter_file_type(*self._get_redirect_file(e.new_url))
 
+        except SessionExpiredException:
+            raise
         except Exception as e:
             logger.error(f"failed to parse filepage {source_URL}: {e}")
             return fileName, fileURL
 
         logger.debug(f"found file {fileName} at {fileURL}")
 
-        # TODO filter by filetype
-        return fileName, fileURL
+        return self._filter_file_type(fileName, fileURL)
+
+    def parse_folderpage(self, source_URL):
+        """:return: tuple of folder name, zip URL and files, see extract_folderpage, None if the page failed"""
+        try:
+            if self.domain != urlparse(source_URL).netloc:
+                logger.debug(f"skipping {source_URL} because it is not on the same domain")
+                return None
+            return self._extract_page("folder", source_URL, LinkType.FOLDER.value)
+        except SessionExpiredException:
+            raise
+        except Exception as e:
+            logger.error(f"failed to parse folder page {source_URL}: {e}")
+            return None
+
+    def _plan_folder_downloads(self, folder, target):
+        """
+        decides how a folder is downloaded, see Config.FOLDER_MODE: as one zip that is extracted while it downloads,
+        or file by file from the folder listing, where conditional requests only transfer the files that changed.
+        in "extract" mode folders that were extracted before are updated file by file, so a single changed pdf
+        does not download the whole folder again
+        :param folder: tuple of folder name, zip URL and files, see extract_folderpage
+        :return: list of download params, either for the zip or for every file of the listing
+        """
+        if folder is None:
+            return []
+        folder_name, zip_url, files = folder
+        param = {"folder": folder_name, "folder_name": target["block"], "course_name": target["course"]}
+        extracted = self.manifest.get(zip_url)
+        if files and (self.config.FOLDER_MODE == "files" or
+                      extracted is not None and os.path.isdir(extracted["path"])):
+            downloads = []
+            for path, url in files:
+                file_name, file_url = self._filter_file_type(os.path.basename(path), url)
+                if file_url is not None:
+                    downloads.append({**param, "file_name": file_name, "file_url": file_url, "folder_path": path})
+            return downloads
+        return [{**param, "file_name": folder_name, "file_url": zip_url, "extract": True, "listing": files}]
+
+    def _is_new_download(self, file_url):
+        """:return: true if file_url is on the crawled domain and no other target downloads it already"""
+        if self.domain != urlparse(file_url).netloc:
+            logger.debug(f"skipping {file_url} because it is not on the same domain")
+            return False
+        if not self.downloads.add(file_url):
+            logger.debug(f"skipping {file_url} because it is already downloaded")
+            return False
+        return True
+
+    def _extract_page(self, kind, source_URL, link_type=None):
+        """
+        fetches a course page ("course"), file page ("file") or folder page ("folder") and extracts its targets,
+        its file name and URL or its files,
+        the result is taken from the extraction cache instead if the page did not change since it was extracted
+        :return: the extracted result, None if the page could not be fetched
+        """
+        key = ExtractionCache.key(kind, source_URL)
+        entry = self.extraction_cache.get(key) if self.extraction_cache else None
+        page = self.soupChef.get_page(source_URL, self.session, headers=ExtractionCache.conditional_headers(entry))
+        if page is None:
+            return None
+        result = self._get_cached_extraction(key, entry, page.status_code, page.headers, page.content)
+        if result is None:
+            result = self._parse_page(kind, page.content, source_URL, link_type)
+            if self.extraction_cache:
+                self.extraction_cache.put(key, page.headers, ExtractionCache.digest(page.content), result)
+        return result
+
+    def _get_cached_extraction(self, key, entry, status_code, headers, content):
+        """:return: the cached result of an unchanged page, None if the page has to be parsed"""
+        if entry is None:
+            if self.extraction_cache:
+                self.metrics.count("extraction_cache", label="miss")
+            return None
+        digest = entry["sha256"] if status_code == 304 else ExtractionCache.digest(content)
+        if digest != entry["sha256"]:
+            self.metrics.count("extraction_cache", label="miss")
+            return None
+        self.metrics.count("extraction_cache", label="not_modified" if status_code == 304 else "hit")
+        self.extraction_cache.put(key, headers, digest, entry["result"])
+        return entry["result"]
+
+    def _parse_page(self, kind, content, source_URL, link_type=None):
+        if self.parse_pool is not None:
+            if kind == "course":
+                return self._parse_in_pool(extract_coursepage_from_markup, content, source_URL)
+            if kind == "folder":
+                return self._parse_in_pool(extract_folderpage_from_markup, content, source_URL)
+            return self._parse_in_pool(extract_filepage_from_markup, content, source_URL, link_type)
+        soup = self.soupChef.get_soup_from_text(content, parse_only=self.strainers.get(kind))
+        if kind == "course":
+            return extract_coursepage_targets(soup, source_URL, self.link_classifier)
+        if kind == "folder":
+            return extract_folderpage(soup, source_URL)
+        return extract_filepage(soup, source_URL, link_type)
+
+    def _parse_in_pool(self, extract, *args):
+        """parses a page in a parse worker process, the calling thread only waits for the extracted result"""
+        with self.metrics.timer("parse"):
+            result = self.parse_pool.submit(extract, *args).result()
+        self.metrics.count("pages")
+        return result
+
+    def _is_wanted_target(self, target):
+        """drops file targets whose URL already shows an excluded file type, before they are enqueued"""
+        if target["type"] != "file":
+            return True
+        file_type = get_file_type_from_url(target["url"])
+        if self.filetype_filter.is_allowed(file_type):
+            return True
+        logger.debug(f"skipping {target['url']} because of its file type {file_type}")
+        return False
+
+    def _filter_file_type(self, fileName, fileURL):
+        """:return: the resolved file or (None, None) if its name or URL shows an excluded file type"""
+        file_type = get_file_type_from_url(fileURL or "")
+        if not file_type:
+            # link texts like "Folie 1.2 Einleitung" contain dots, so only take short alphanumeric endings
+            name_ending = re.search(r"\.([A-Za-z0-9]{1,5})$", (fileName or "").strip())
+            file_type = name_ending.group(1) if name_ending else ""
+        if self.filetype_filter.is_allowed(file_type):
+            return fileName, fileURL
+        logger.debug(f"skipping {fileName} at {fileURL} because of its file type {file_type}")
+        return None, None
+
+    @staticmethod
+    def _get_direct_file(source_URL):
+        """
+        checks if the URL already points to a file instead of a moodle page
+        :return: tuple of file name and file URL or None if the URL is a page that has to be parsed
+        """
+        pathEnding = os.path.splitext(source_URL)[-1]
+        if pathEnding != "" and not pathEnding.startswith(".php"):
+            # is file url
+            return os.path.basename(urlparse(source_URL).path), source_URL
+        return None
+
+    @staticmethod
+    def _get_redirect_file(new_url):
+        return unquote(urlparse(new_url).path.split("/")[-1]), new_url
 
     def _filter(self, elements):
         filteredElements = []
@@ -584,17 +3136,13 @@ class Kraken:
             else:
                 name = element.text.strip()
 
-            valid = True
-            for condition in self.config.FILTER_COURSES:
-                is_included = bool(re.search(condition["condition_string"], name))
-
-                if condition["include_condition"]:
-                    valid = valid and is_included
-                else:
-                    valid = valid and not is_included
-
-            if valid:
+            decision = self.course_filter.decide(name)
+            self.filter_decisions[name] = decision
+            if decision.accepted:
                 filteredElements.append(element)
+            else:
+                condition = "include" if decision.rule["include_condition"] else "exclude"
+                logger.info(f"filtered course {name} by {condition} condition {decision.rule['condition_string']!r}")
 
         logger.info(f"filtered {len(elements) - len(filteredElements)} elements")
         return filteredElements
@@ -603,55 +3151,889 @@ class Kraken:
         self.session = requests.Session()
         if self.config.URLLIB_POOLSIZE:
             logger.info(f"setting maxsize of urllib pool to: {self.config.URLLIB_POOLSIZE}")
-        self.session.get_adapter(self.config.BASE_URL).poolmanager.connection_pool_kw[
-            "maxsize"] = self.config.URLLIB_POOLSIZE
-
-    def save_file(self, param):
+            # pool_block limits the concurrent connections per host to the pool size, workers of all stages
+            # wait for a free connection instead of opening (and discarding) extra ones
+            adapter = HTTPAdapter(pool_maxsize=self.config.URLLIB_POOLSIZE, pool_block=True)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        self.session.hooks["response"].append(self.metrics.response_hook)
+
+    def _get_file_path(self, param):
+        """
+        computes where a file is saved to
+        :param param: dict with file_name, folder_name and course_name, files of a moodle folder also have
+            folder and folder_path, their path inside the folder
+        :return: tuple of the directory and the file name inside of it
+        """
+        if "folder_path" in param:
+            full_path = get_folder_member_path(self._get_folder_path(param), param["folder_path"]) or \
+                os.path.join(self._get_folder_path(param), param["file_name"])
+            return os.path.dirname(full_path), os.path.basename(full_path)
         file_name = param["file_name"].replace(" ", "_")
         file_name = file_name[0:-6].replace(".", "_") + file_name[-6:]
-        file_url = param["file_url"]
         block_name = slugify(param["folder_name"])
         course_name = slugify(param["course_name"])
+        file_path = os.path.join(self.config.DOWNLOAD_PATH, course_name, block_name)
+        file_type = os.path.splitext(file_name)[-1]
+        if file_type == "":
+            # TODO set default as a constant
+            file_name += ".zip"
+            # file_type = ".zip"
+        return file_path, file_name
+
+    def _get_folder_path(self, param):
+        """:return: the directory a moodle folder is extracted into, next to the other files of its block"""
+        return os.path.join(self.config.DOWNLOAD_PATH, slugify(param["course_name"]), slugify(param["folder_name"]),
+                            slugify(param["folder"]))
+
+    def save_file(self, param):
+        file_url = param["file_url"]
+        course_name = slugify(param["course_name"])
+        file_path, file_name = self._get_file_path(param)
 
         try:
-            # first head to get size
-            # TODO do that only for certain file types
-            try:
-                file_size = int(self.session.head(file_url).headers["Content-Length"])
-            except Exception as e:
-                logger.error(f"failed to get file size of {file_name} from {course_name}: {e}")
-                file_size = 1
-            if (file_size / 1000 ** 2) > self.config.MAX_FILE_SIZE_IN_MB:
-                logger.info(f"file {file_name} from {course_name} is too big: {file_size / 1000 ** 2} MB")
-                return
-            # get file bytes
-            file = self.session.get(file_url)
-            file_bytes = file.content
-
-            file_path = os.path.join(self.config.DOWNLOAD_PATH, course_name, block_name)
-            file_type = os.path.splitext(file_name)[-1]
-            if file_type == "":
-                # TODO set default as a constant
-                file_name += ".zip"
-                # file_type = ".zip"
+            # only transfer files that changed since the last run
+            conditional_headers = self.manifest.conditional_headers(file_url)
             full_path = os.path.join(file_path, file_name)
-            os.makedirs(file_path, exist_ok=True)
-            with open(full_path, "wb") as f:
-                f.write(file_bytes)
+            if param.get("extract"):
+                transfer = lambda: self._stream_folder(file_url, param, conditional_headers)
+            else:
+                # a retry continues a broken transfer with a range request, see _get_partial_download
+                transfer = lambda: self._stream_to_file(file_url, full_path, conditional_headers)
+            if self.request_scheduler.retry(transfer, file_url) is None:
+                logger.debug(f"file {file_name} of {course_name} is unchanged")
+                return
+        except FileTooBigException as e:
+            logger.info(f"file {file_name} from {course_name} is too big: more than {e.received_bytes / 1000 ** 2} MB")
+            return
+        except FileTypeFilteredException as e:
+            logger.info(f"skipping file {file_name} from {course_name} because of its file type {e.file_type}")
+            return
+        except SessionExpiredException:
+            raise
         except Exception as e:
             logger.error(f"error while saving file {file_name} from {file_url}: {e}")
         logger.debug(f"saved file {file_name} of {course_name}")
 
+    def _stream_to_file(self, file_url, full_path, headers=None):
+        """
+        streams the file behind file_url chunk by chunk into a temporary file next to full_path and
+        atomically renames it once the download is complete, so memory usage is bounded by the chunk size
+        and no half written file is left behind under the final name
+        size limit and file type filter are checked on the headers of the same request before the body is read
+        the saved file is recorded in the manifest, a partial download left over from an earlier attempt is
+        continued with a range request if the server still serves the same version of the file
+        :param file_url: the URL to download
+        :param full_path: the final path of the file
+        :param headers: additional request headers, e.g. conditional headers from the manifest
+        :return: the number of bytes written, None if the server answered 304 not modified
+        :raises FileTooBigException: if the file exceeds MAX_FILE_SIZE_IN_MB
+        :raises FileTypeFilteredException: if the file type is excluded by FILTER_FILETYPES
+        """
+        part_path = full_path + ".part"
+        max_bytes = self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2
+        received_bytes = 0
+        digest = hashlib.sha256()
+        conditional_headers = headers
+        headers = dict(headers or {})
+        offset, validator = self._get_partial_download(part_path, file_url)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        try:
+            send = lambda: self.session.get(file_url, headers=headers, stream=True, timeout=self.config.TIMEOUT)
+            with self.request_scheduler.request(send, download=True) as response:
+                if is_login_url(response.url):
+                    raise SessionExpiredException(file_url)
+                if response.status_code == 304:
+                    self._drop_partial_download(part_path)
+                    return None
+                if response.status_code == 416 and offset:
+                    raise RangeNotSatisfiableException()
+                response.raise_for_status()
+                mode = "wb"
+                if response.status_code == 206 and \
+                        response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                    logger.debug(f"resuming download of {file_url} at byte {offset}")
+                    mode = "ab"
+                    received_bytes = offset
+                    with open(part_path, "rb") as f:
+                        for chunk in iter(lambda: f.read(self.config.CHUNK_SIZE_IN_KB * 1024), b""):
+                            digest.update(chunk)
+                self._check_response_headers(response.headers, received_bytes)
+                with self.checkpoint_lock:
+                    self.partial_downloads[part_path] = {"url": file_url, "etag": response.headers.get("ETag"),
+                                                         "last_modified": response.headers.get("Last-Modified")}
+                # the writer stage writes the chunks, this thread only waits for the disk at the end of the file
+                with self.disk_writer.open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=self.config.CHUNK_SIZE_IN_KB * 1024):
+                        received_bytes += len(chunk)
+                        if received_bytes > max_bytes:
+                            raise FileTooBigException(received_bytes)
+                        digest.update(chunk)
+                        f.write(chunk)
+                        self.metrics.count("bytes_downloaded", len(chunk))
+            self._finalize_download(part_path, full_path, digest.hexdigest())
+            self._drop_partial_download(part_path)
+        except RangeNotSatisfiableException:
+            # the file changed or shrank since the partial download, start over right away without a range
+            logger.debug(f"partial download of {file_url} does not fit the file anymore, downloading it again")
+            self._drop_partial_download(part_path)
+            return self._stream_to_file(file_url, full_path, conditional_headers)
+        except (FileTooBigException, FileTypeFilteredException):
+            self._drop_partial_download(part_path)
+            raise
+        self.manifest.record(file_url, full_path, response.headers, received_bytes, digest.hexdigest())
+        return received_bytes
+
+    def _stream_folder(self, zip_url, param, headers=None, spool=False):
+        """
+        streams the zip of a moodle folder and extracts its members into the folder directory while it downloads,
+        see ZipStreamExtractor. a zip that can not be extracted as a stream is downloaded again into a temporary
+        file and extracted from there
+        :param param: the download param of the folder, see _plan_folder_downloads
+        :param headers: additional request headers, e.g. conditional headers from the manifest
+        :param spool: save the zip before extracting it instead of extracting it as a stream
+        :return: the number of bytes received, None if the server answered 304 not modified
+        """
+        folder_dir = self._get_folder_path(param)
+        spool_path = folder_dir + ".zip.part"
+        digest = hashlib.sha256()
+        stream_error = None
+        send = lambda: self.session.get(zip_url, headers=headers, stream=True, timeout=self.config.TIMEOUT)
+        with self.request_scheduler.request(send, download=True) as response:
+            if is_login_url(response.url):
+                raise SessionExpiredException(zip_url)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            # the file type filter applies to the members, not to the zip
+            self._check_response_headers(response.headers, check_file_type=False)
+            extractor = self._get_folder_extractor(zip_url, param, response.headers)
+            chunks = response.iter_content(chunk_size=self.config.CHUNK_SIZE_IN_KB * 1024)
+            try:
+                if spool:
+                    with self.disk_writer.open(spool_path, "wb") as f:
+                        received_bytes = self._receive_folder(chunks, f.write, digest)
+                    extractor.extract_archive(spool_path)
+                else:
+                    received_bytes = self._receive_folder(chunks, extractor.feed, digest)
+                    extractor.close()
+            except ZipStreamError as e:
+                stream_error = e
+            finally:
+                extractor.abort()
+                if os.path.exists(spool_path):
+                    os.remove(spool_path)
+        if stream_error is not None:
+            logger.info(f"extracting {zip_url} after the download, it can not be extracted as a stream: {stream_error}")
+            return self._stream_folder(zip_url, param, headers, spool=True)
+        self.manifest.record(zip_url, folder_dir, response.headers, received_bytes, digest.hexdigest())
+        return received_bytes
+
+    def _receive_folder(self, chunks, write, digest):
+        """:return: the number of bytes passed from chunks to write"""
+        max_bytes = self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2
+        received_bytes = 0
+        for chunk in chunks:
+            received_bytes += len(chunk)
+            if received_bytes > max_bytes:
+                raise FileTooBigException(received_bytes)
+            digest.update(chunk)
+            write(chunk)
+            self.metrics.count("bytes_downloaded", len(chunk))
+        return received_bytes
+
+    def _get_folder_extractor(self, zip_url, param, headers):
+        """
+        builds the extractor for the zip of a folder, members are recorded in the manifest under their URL in the
+        folder listing, with the date of the zip response as last modification. a later run that updates the
+        folder file by file asks for them with If-Modified-Since and only transfers the files that changed.
+        members whose content did not change are not written again
+        :param headers: the headers of the zip response
+        """
+        folder_dir = self._get_folder_path(param)
+        listing = {get_folder_member_path(folder_dir, path): url for path, url in param.get("listing", [])}
+        validators = {"Last-Modified": headers.get("Date") or formatdate(usegmt=True)}
+
+        def store(name, full_path, part_path, sha256, size):
+            member_url = listing.get(full_path, f"{zip_url}#{name}")
+            entry = self.manifest.get(member_url)
+            if entry is not None and entry["sha256"] == sha256 and entry["path"] == full_path \
+                    and os.path.exists(full_path):
+                os.remove(part_path)
+                self.metrics.count("folder_members", label="unchanged")
+                return
+            self._finalize_download(part_path, full_path, sha256)
+            self.manifest.record(member_url, full_path, validators, size, sha256)
+            self.metrics.count("folder_members", label="extracted")
+
+        def accept(name):
+            file_type = os.path.splitext(name)[-1]
+            if self.filetype_filter.is_allowed(file_type):
+                return True
+            logger.debug(f"skipping {name} of {zip_url} because of its file type {file_type}")
+            return False
+
+        return ZipStreamExtractor(folder_dir, store, accept=accept, open_file=self.disk_writer.open,
+                                  max_bytes=self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2)
+
+    def _check_response_headers(self, headers, offset=0, check_file_type=True):
+        """
+        decides from the headers of a download response if its body should be read at all
+        :param headers: the response headers
+        :param offset: bytes already on disk when a download is resumed
+        :param check_file_type: false for responses whose content is filtered by type later, like folder zips
+        """
+        file_type = get_file_type_from_headers(headers)
+        if check_file_type and not self.filetype_filter.is_allowed(file_type):
+            raise FileTypeFilteredException(file_type)
+        content_length = headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit():
+            total_bytes = offset + int(content_length)
+            if total_bytes > self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2:
+                raise FileTooBigException(total_bytes)
+
+    def _finalize_download(self, part_path, full_path, sha256):
+        """
+        moves a completed download to its final path
+        with a content store configured the file is stored once under its digest and linked to full_path,
+        so the same slides linked from several courses only take up disk space once
+        """
+        if not self.config.CONTENT_STORE:
+            os.replace(part_path, full_path)
+            return
+
+        object_dir = os.path.join(self.config.CONTENT_STORE, sha256[:2])
+        object_path = os.path.join(object_dir, sha256)
+        self.disk_writer.directories.ensure(object_dir)
+        if os.path.exists(object_path):
+            os.remove(part_path)
+        else:
+            self._move_to_store(part_path, object_path)
+        if os.path.exists(full_path) and os.path.samefile(full_path, object_path):
+            return
+
+        # link next to the target first and rename it over the old file, so full_path is never missing
+        link_path = full_path + ".link"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        try:
+            if self.config.CONTENT_STORE_LINK != "hardlink":
+                raise OSError("symlink configured")
+            os.link(object_path, link_path)
+        except OSError:
+            # hardlinks do not work across file systems
+            os.symlink(os.path.relpath(object_path, os.path.dirname(full_path)), link_path)
+        os.replace(link_path, full_path)
+
+    @staticmethod
+    def _move_to_store(part_path, object_path):
+        try:
+            os.replace(part_path, object_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # the content store is on another file system: copy next to the object and rename, so an object that
+            # exists is always complete
+            tmp_path = object_path + ".part"
+            try:
+                shutil.copyfile(part_path, tmp_path)
+                os.replace(tmp_path, object_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            os.remove(part_path)
+
+    def _get_partial_download(self, part_path, file_url):
+        """
+        looks up a resumable partial download
+        :return: tuple of the number of bytes already on disk and the validator for the If-Range header,
+        (0, None) if the download has to start over
+        """
+        with self.checkpoint_lock:
+            partial = self.partial_downloads.get(part_path)
+        if partial is None or partial["url"] != file_url or not os.path.exists(part_path):
+            return 0, None
+        # weak etags are not allowed in If-Range
+        validator = partial["etag"] if partial["etag"] and not partial["etag"].startswith("W/") \
+            else partial["last_modified"]
+        if validator is None:
+            return 0, None
+        return os.path.getsize(part_path), validator
+
+    def _drop_partial_download(self, part_path):
+        with self.checkpoint_lock:
+            self.partial_downloads.pop(part_path, None)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
     def _shutdown(self):
-        logger.info("shutting down pool and soupChef")
-        self.pool.shutdown(wait=True)
+        logger.info("shutting down pools and soupChef")
+        for stage in self.stages.values():
+            stage.shutdown(wait=True)
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
         self.soupChef.shutdown()
+        self.disk_writer.shutdown()
+        self.manifest.compact()
+        self._save_extraction_cache()
+
+    def _save_extraction_cache(self):
+        if self.extraction_cache is None:
+            return
+        try:
+            self.extraction_cache.save()
+        except OSError as e:
+            logger.error(f"failed to write extraction cache {self.extraction_cache.path}: {e}")
+
+
+class AsyncKraken(Kraken):
+    """
+    asyncio engine, crawls the same targets as Kraken but keeps all requests in flight on one event loop
+    instead of blocking a thread per request. every stage (course pages, file pages, downloads) is bounded by
+    its own semaphore from Config.ASYNC_CONCURRENCY and the crawl ends as soon as the last task is done
+    login and course discovery reuse the synchronous session, the cookies are copied to the aiohttp session
+    the requests share the RequestScheduler of Kraken for the adaptive limit, retries and Retry-After pauses
+    """
+
+    def __init__(self, scraping_config, resume=False, courses=None, cookie_file=None):
+        super().__init__(scraping_config, resume=resume, courses=courses, cookie_file=cookie_file)
+        self.http = None
+        self.limits = {}
+        self.done = None
+        self.tasks = set()
+
+    def _get_request_limit(self):
+        # the connector of the aiohttp session allows this many connections
+        return sum(self.config.ASYNC_CONCURRENCY.values())
+
+    def run(self):
+        if aiohttp is None:
+            raise Exception("the asyncio engine needs aiohttp, install it with: pip install aiohttp")
+
+        self._warm_up_webdrivers()
+        self._init_session()
+        self._log_in()
+        try:
+            asyncio.run(self._crawl())
+        except KeyboardInterrupt:
+            logger.warning("interrupted, writing checkpoint - continue with --resume")
+            self._write_checkpoint()
+            return
+        except Exception as e:
+            logger.error(e)
+            self._write_checkpoint()
+            return
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+            self.soupChef.shutdown()
+            self.disk_writer.shutdown()
+            self.manifest.compact()
+            self._save_extraction_cache()
+
+        self._finish_checkpoint()
+        logger.info("finished scraping")
+        logger.info(f"visited: {len(self.visited)}")
+        self._report_metrics()
+
+    async def _crawl(self):
+        self.limits = {stage: asyncio.Semaphore(limit) for stage, limit in self.config.ASYNC_CONCURRENCY.items()}
+        self.done = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit=sum(self.config.ASYNC_CONCURRENCY.values()))
+        timeout = aiohttp.ClientTimeout(sock_connect=self.config.TIMEOUT, sock_read=self.config.TIMEOUT)
+        # unsafe allows cookies for ip hosts
+        cookie_jar = aiohttp.CookieJar(unsafe=True)
+        cookie_jar.update_cookies({cookie.name: cookie.value for cookie in self.session.cookies})
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=cookie_jar) as self.http:
+            # the queue holds the base target or the targets restored from a checkpoint
+            target = self.to_visit.get_nowait()
+            while target is not None:
+                self._spawn(target)
+                target = self.to_visit.get_nowait()
+            try:
+                if not self.to_visit.is_finished():
+                    await self._report_progress_until_done()
+            except asyncio.CancelledError:
+                # interrupted, stop the tasks before their session is closed under them
+                for task in self.tasks:
+                    task.cancel()
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+                raise
+        logger.info(self.to_visit.format_stats())
+
+    async def _report_progress_until_done(self):
+        # wake up regularly to write checkpoints and report progress while tasks are running
+        intervals = [interval for interval in (self.config.PROGRESS_INTERVAL, self.config.CHECKPOINT_INTERVAL)
+                     if interval > 0]
+        while True:
+            try:
+                await asyncio.wait_for(self.done.wait(), timeout=min(intervals, default=None))
+                return
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self._maybe_write_checkpoint)
+                self._maybe_report_progress()
+
+    def _update_gauges(self):
+        # the thread stages are idle in this engine, the open tasks show how much is in flight
+        for target_type, counts in self.to_visit.stats().items():
+            self.metrics.set_gauge("queue_depth", counts["pending"], label=target_type)
+            self.metrics.set_gauge("in_flight", counts["running"], label=target_type)
+        self.metrics.set_gauge("writer_queue_depth", self.disk_writer.pending())
+
+    def _spawn(self, target, queued=True):
+        if not queued:
+            self.to_visit.start(target)
+        # the loop only keeps weak references to tasks
+        task = asyncio.ensure_future(self._scrape_async(target))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def _enqueue(self, target):
+        if self.visited.add(target["url"]):
+            self._spawn(target, queued=False)
+
+    async def _scrape_async(self, target):
+        url = target["url"]
+        source_URL = self.config.BASE_URL + url if self._is_relative_URL(url) else url
+        generation = self.session_generation
+        cancelled = False
+        try:
+            if target["type"] == "base":
+                await self._discover_courses_async()
+
+            elif target["type"] == "course":
+                async with self.limits["course"]:
+                    new_targets = await self._extract_page_async("course", source_URL)
+                for new_target in new_targets:
+                    if self._is_wanted_target(new_target):
+                        self._enqueue(new_target)
+
+            elif target["type"] == "download":
+                async with self.limits["download"]:
+                    with self.metrics.timer("download"):
+                        await self._save_file_async(target)
+
+            elif target.get("link_type") == LinkType.FOLDER.value and self.config.FOLDER_MODE != "zip":
+                async with self.limits["file"]:
+                    with self.metrics.timer("resolve"):
+                        folder = await self._parse_folderpage_async(source_URL)
+                for param in self._plan_folder_downloads(folder, target):
+                    if self._is_new_download(param["file_url"]):
+                        self._spawn({"type": "download", "url": param["file_url"], **param}, queued=False)
+
+            else:
+                async with self.limits["file"]:
+                    with self.metrics.timer("resolve"):
+                        file_name, file_url = await self._parse_filepage_async(source_URL, target.get("link_type"))
+                if file_name is not None and file_url is not None:
+                    if not self._is_new_download(file_url):
+                        return
+                    # a download of its own, so it can be retried without resolving the file page again
+                    self._spawn({"type": "download", "url": file_url, "file_name": file_name, "file_url": file_url,
+                                 "folder_name": target["block"], "course_name": target["course"]}, queued=False)
+
+        except SessionExpiredException as e:
+            logger.debug(e)
+            self.metrics.count("session_expired")
+            # the login runs in a thread, _renew_session makes sure only the first expired task logs in
+            if await asyncio.to_thread(self._renew_session, generation):
+                self.http.cookie_jar.update_cookies({cookie.name: cookie.value for cookie in self.session.cookies})
+                # a copy, the finally below marks this target done
+                self._spawn(dict(target), queued=False)
+            else:
+                self._park_target(target)
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            # interrupted, the target stays running so the checkpoint written after the loop keeps it
+            cancelled = True
+            raise
+        except Exception as e:
+            logger.error(e)
+        finally:
+            if not cancelled:
+                self.to_visit.task_done(target)
+                if self.to_visit.is_finished():
+                    self.done.set()
+
+    async def _discover_courses_async(self):
+        """async counterpart of Kraken._iter_course_pages, enqueues the courses of every page as it arrives"""
+        content = await self._get_course_page_async(0)
+        pages = [asyncio.sleep(0, result=content)]
+        pages += [self._get_course_page_async(index) for index in range(1, self._get_max_page_index(content) + 1)]
+        for page in asyncio.as_completed(pages):
+            try:
+                courses = (await page)["courses"]
+            except SessionExpiredException:
+                raise
+            except Exception as e:
+                logger.error(f"ajax call failed: {e}")
+                continue
+            for course in self._filter(courses):
+                self._enqueue({"url": course, "type": "course"})
+
+    async def _get_course_page_async(self, index):
+        async def fetch():
+            async with self.request_scheduler.request_async(
+                    lambda: self.http.get(self._get_course_page_url(index))) as response:
+                self.metrics.count("requests", label=str(response.status))
+                if response.status in RequestScheduler.RETRY_STATUS:
+                    response.raise_for_status()
+                if is_login_url(str(response.url)):
+                    raise SessionExpiredException(str(response.url))
+                if response.status != 200:
+                    raise Exception(f"ajax call (nr: {index}) failed with status {response.status}")
+                # remui answers with a text/html content type
+                return await response.json(content_type=None)
+
+        content = await self.request_scheduler.retry_async(fetch, f"ajax call (nr: {index})")
+        logger.info(f"ajax call (nr: {index}) successful - received {len(content['courses'])} courses")
+        return content
+
+    async def _get_page_async(self, URL, headers=None):
+        """
+        async counterpart of SoupChef.get_page
+        :return: tuple of status code, headers and body of the response
+        :raises RedirectException: if the page is a forced download
+        """
+        async def fetch():
+            async with self.request_scheduler.request_async(
+                    lambda: self.http.get(URL, headers=headers, allow_redirects=False)) as page:
+                self.metrics.count("requests", label=str(page.status))
+                if page.status in RequestScheduler.RETRY_STATUS:
+                    page.raise_for_status()
+                # read the body while the request still holds its slot
+                return page, await page.read()
+
+        with self.metrics.timer("fetch"):
+            page, content = await self.request_scheduler.retry_async(fetch, URL)
+        if is_login_url(page.headers.get("Location")):
+            raise SessionExpiredException(URL)
+        if page.status == 303:
+            logger.debug("request got redirected: " + URL + " to " + page.headers["Location"])
+            raise RedirectException(page.headers["Location"])
+        if LOGIN_FORM_MARKER in content:
+            raise SessionExpiredException(URL)
+        return page.status, page.headers, content
+
+    async def _extract_page_async(self, kind, source_URL, link_type=None):
+        """async counterpart of Kraken._extract_page, parsing runs in a thread or the parse pool"""
+        key = ExtractionCache.key(kind, source_URL)
+        entry = self.extraction_cache.get(key) if self.extraction_cache else None
+        status, headers, content = await self._get_page_async(source_URL, ExtractionCache.conditional_headers(entry))
+        result = self._get_cached_extraction(key, entry, status, headers, content)
+        if result is not None:
+            return result
+        if self.parse_pool is None:
+            result = await asyncio.to_thread(self._parse_page, kind, content, source_URL, link_type)
+        elif kind == "course":
+            result = await self._parse_in_pool_async(extract_coursepage_from_markup, content, source_URL)
+        elif kind == "folder":
+            result = await self._parse_in_pool_async(extract_folderpage_from_markup, content, source_URL)
+        else:
+            result = await self._parse_in_pool_async(extract_filepage_from_markup, content, source_URL, link_type)
+        if self.extraction_cache:
+            self.extraction_cache.put(key, headers, ExtractionCache.digest(content), result)
+        return result
+
+    async def _parse_in_pool_async(self, extract, *args):
+        with self.metrics.timer("parse"):
+            result = await asyncio.get_running_loop().run_in_executor(self.parse_pool, extract, *args)
+        self.metrics.count("pages")
+        return result
+
+    async def _parse_filepage_async(self, source_URL, link_type=None):
+        fileName, fileURL = None, None
+        try:
+            if self.domain != urlparse(source_URL).netloc:
+                logger.debug(f"skipping {source_URL} because it is not on the same domain")
+                return fileName, fileURL
+
+            direct_file = self._get_direct_file(source_URL)
+            if direct_file is not None:
+                return self._filter_file_type(*direct_file)
+
+            fileName, fileURL = await self._extract_page_async("file", source_URL, link_type)
+
+        except RedirectException as e:
+            # some resource urls automatically redirect to the file
+            return self._filter_file_type(*self._get_redirect_file(e.new_url))
+
+        except SessionExpiredException:
+            raise
+        except Exception as e:
+            logger.error(f"failed to parse filepage {source_URL}: {e}")
+            return fileName, fileURL
+
+        logger.debug(f"found file {fileName} at {fileURL}")
+        return self._filter_file_type(fileName, fileURL)
+
+    async def _parse_folderpage_async(self, source_URL):
+        """async counterpart of Kraken.parse_folderpage"""
+        try:
+            if self.domain != urlparse(source_URL).netloc:
+                logger.debug(f"skipping {source_URL} because it is not on the same domain")
+                return None
+            return await self._extract_page_async("folder", source_URL, LinkType.FOLDER.value)
+        except SessionExpiredException:
+            raise
+        except Exception as e:
+            logger.error(f"failed to parse folder page {source_URL}: {e}")
+            return None
+
+    async def _save_file_async(self, param):
+        file_url = param["file_url"]
+        course_name = slugify(param["course_name"])
+        file_path, file_name = self._get_file_path(param)
+
+        try:
+            headers = self.manifest.conditional_headers(file_url)
+            if param.get("extract"):
+                transfer = lambda: self._stream_folder_async(file_url, param, headers)
+            else:
+                transfer = lambda: self._stream_to_file_async(file_url, os.path.join(file_path, file_name), headers)
+            received_bytes = await self.request_scheduler.retry_async(transfer, file_url)
+            if received_bytes is None:
+                logger.debug(f"file {file_name} of {course_name} is unchanged")
+                return
+        except FileTooBigException as e:
+            logger.info(f"file {file_name} from {course_name} is too big: more than {e.received_bytes / 1000 ** 2} MB")
+            return
+        except FileTypeFilteredException as e:
+            logger.info(f"skipping file {file_name} from {course_name} because of its file type {e.file_type}")
+            return
+        except SessionExpiredException:
+            raise
+        except Exception as e:
+            logger.error(f"error while saving file {file_name} from {file_url}: {e}")
+            return
+        logger.debug(f"saved file {file_name} of {course_name}")
+
+    async def _stream_to_file_async(self, file_url, full_path, headers=None):
+        """
+        async counterpart of Kraken._stream_to_file without resuming partial downloads
+        :return: the number of bytes written, None if the server answered 304 not modified
+        """
+        part_path = full_path + ".part"
+        max_bytes = self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2
+        received_bytes = 0
+        digest = hashlib.sha256()
+        try:
+            async with self.request_scheduler.request_async(lambda: self.http.get(file_url, headers=headers),
+                                                            download=True) as response:
+                self.metrics.count("requests", label=str(response.status))
+                if is_login_url(str(response.url)):
+                    raise SessionExpiredException(file_url)
+                if response.status == 304:
+                    return None
+                response.raise_for_status()
+                self._check_response_headers(response.headers)
+                f = await self.disk_writer.open_async(part_path, "wb")
+                try:
+                    async for chunk in response.content.iter_chunked(self.config.CHUNK_SIZE_IN_KB * 1024):
+                        received_bytes += len(chunk)
+                        if received_bytes > max_bytes:
+                            raise FileTooBigException(received_bytes)
+                        digest.update(chunk)
+                        await f.write_async(chunk)
+                        self.metrics.count("bytes_downloaded", len(chunk))
+                except BaseException:
+                    await asyncio.to_thread(f.close, False)
+                    raise
+                await asyncio.to_thread(f.close)
+            # renaming, linking into the content store and the manifest touch the disk, so they stay off the loop
+            await asyncio.to_thread(self._finalize_download, part_path, full_path, digest.hexdigest())
+        finally:
+            await asyncio.to_thread(self._remove_part_file, part_path)
+        await asyncio.to_thread(self.manifest.record, file_url, full_path, response.headers, received_bytes,
+                                digest.hexdigest())
+        return received_bytes
+
+    @staticmethod
+    def _remove_part_file(part_path):
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    async def _stream_folder_async(self, zip_url, param, headers=None):
+        """
+        async counterpart of Kraken._stream_folder, a zip that can not be extracted as a stream is saved and
+        extracted by the synchronous session in a thread
+        :return: the number of bytes received, None if the server answered 304 not modified
+        """
+        max_bytes = self.config.MAX_FILE_SIZE_IN_MB * 1000 ** 2
+        received_bytes = 0
+        digest = hashlib.sha256()
+        try:
+            async with self.request_scheduler.request_async(lambda: self.http.get(zip_url, headers=headers),
+                                                            download=True) as response:
+                self.metrics.count("requests", label=str(response.status))
+                if is_login_url(str(response.url)):
+                    raise SessionExpiredException(zip_url)
+                if response.status == 304:
+                    return None
+                response.raise_for_status()
+                self._check_response_headers(response.headers, check_file_type=False)
+                extractor = self._get_folder_extractor(zip_url, param, response.headers)
+                try:
+                    async for chunk in response.content.iter_chunked(self.config.CHUNK_SIZE_IN_KB * 1024):
+                        received_bytes += len(chunk)
+                        if received_bytes > max_bytes:
+                            raise FileTooBigException(received_bytes)
+                        digest.update(chunk)
+                        # decompressing and waiting for the writer stage stay off the event loop
+                        await asyncio.to_thread(extractor.feed, chunk)
+                        self.metrics.count("bytes_downloaded", len(chunk))
+                    extractor.close()
+                finally:
+                    await asyncio.to_thread(extractor.abort)
+        except ZipStreamError as e:
+            logger.info(f"extracting {zip_url} after the download, it can not be extracted as a stream: {e}")
+            return await asyncio.to_thread(self.request_scheduler.retry,
+                                           lambda: self._stream_folder(zip_url, param, headers, True), zip_url)
+        await asyncio.to_thread(self.manifest.record, zip_url, self._get_folder_path(param), response.headers,
+                                received_bytes, digest.hexdigest())
+        return received_bytes
+
+
+def run_sharded(config, shard_count, workers, resume=False):
+    """
+    crawls the courses split into shards: logs in once, puts the shards and the login cookies into the
+    ShardQueue, crawls them with local worker processes and merges the manifests of all shards at the end
+    nodes that run run_shard_worker on the same queue directory take over shards as well
+    :param workers: local worker processes, 0 waits for other nodes to crawl all shards
+    """
+    queue = ShardQueue(config.SHARD_QUEUE or os.path.join(config.DOWNLOAD_PATH, ".kraken_shards"))
+    if resume and queue.has_shards():
+        queue.requeue_claimed()
+        logger.info(f"resuming sharded crawl from {queue.path}")
+    else:
+        kraken = Kraken(config)
+        kraken._init_session()
+        kraken._do_login()
+        shards = split_courses(kraken._filter(kraken._get_courses()), shard_count, config.SHARD_COURSES)
+        queue.reset()
+        kraken._save_cookies(queue.cookie_path)
+        queue.put(shards)
+        kraken._shutdown()
+        logger.info(f"split the crawl into {len(shards)} shards in {queue.path}")
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_shard_worker, args=(config, queue.path), name=f"shard-worker-{index}")
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    # shards of a local worker that crashed or stopped with a checkpoint go back to the queue
+    unfinished = queue.requeue_claimed({ShardQueue.owner(process.pid) for process in processes})
+    if unfinished:
+        logger.warning(f"local workers did not finish {', '.join(unfinished)}")
+    _wait_for_other_nodes(queue, config.SHARD_STALL_TIMEOUT, local_workers=bool(processes))
+
+    Manifest(config.MANIFEST_FILE or os.path.join(config.DOWNLOAD_PATH, ".kraken_manifest.jsonl")) \
+        .merge(queue.manifests())
+    if config.EXTRACTION_CACHE_SIZE:
+        extraction_cache = ExtractionCache(
+            config.EXTRACTION_CACHE_FILE or os.path.join(config.DOWNLOAD_PATH, ".kraken_extraction_cache.json"),
+            config.EXTRACTION_CACHE_SIZE)
+        extraction_cache.merge(queue.caches())
+        extraction_cache.save()
+    logger.info("finished sharded crawl")
+
+
+def _wait_for_other_nodes(queue, stall_timeout, local_workers):
+    """
+    waits until other nodes crawled the shards that are left
+    :param local_workers: true if local workers crawled shards before, without them other nodes may still start
+    :raises Exception: if shards are left that no worker crawls, or no shard made progress for stall_timeout seconds
+    """
+    progress = queue.progress()
+    last_progress = time.monotonic()
+    while queue.has_shards():
+        if time.monotonic() - last_progress > stall_timeout:
+            raise Exception(f"no shard made progress for {stall_timeout}s - continue with --resume")
+        time.sleep(SHARD_POLL_INTERVAL)
+        if queue.progress() != progress:
+            progress = queue.progress()
+            last_progress = time.monotonic()
+        elif local_workers and queue.has_shards() and not queue.has_claimed():
+            # idle nodes claim within a poll interval, pending shards nobody claimed have no worker left
+            raise Exception("no worker is left for the remaining shards - continue with --resume")
+
+
+def _seed_shard_file(path, shard_path):
+    """copies the file of the last crawl for a shard, a resumed shard keeps the one it has"""
+    if os.path.exists(path) and not os.path.exists(shard_path):
+        shutil.copyfile(path, shard_path)
+
+
+def run_shard_worker(config, queue_path, idle_timeout=0):
+    """
+    crawls shards of the ShardQueue at queue_path until none is left, runs on any node that can reach it
+    :param idle_timeout: seconds to wait for a shard while none is pending, so a node can start before the
+        coordinator filled the queue or take over shards that are requeued
+    """
+    queue = ShardQueue(queue_path)
+    engine = AsyncKraken if config.ENGINE == "asyncio" else Kraken
+    crawled = False
+    idle_since = time.monotonic()
+    while True:
+        claimed = queue.claim()
+        if claimed is None:
+            # the crawl this worker took part in is over once no shard is left
+            if (crawled and not queue.has_shards()) or time.monotonic() - idle_since >= idle_timeout:
+                return
+            time.sleep(min(SHARD_POLL_INTERVAL, idle_timeout))
+            continue
+        name, courses = claimed
+        shard_config = copy.copy(config)
+        # every shard writes a manifest and a cache of its own, they start from the ones of the last crawl, so
+        # unchanged files and pages are skipped, and are merged back by the coordinator
+        shard_config.MANIFEST_FILE = queue.manifest_path(name)
+        _seed_shard_file(config.MANIFEST_FILE or os.path.join(config.DOWNLOAD_PATH, ".kraken_manifest.jsonl"),
+                         shard_config.MANIFEST_FILE)
+        shard_config.CHECKPOINT_FILE = queue.checkpoint_path(name)
+        shard_config.EXTRACTION_CACHE_FILE = queue.cache_path(name)
+        if config.EXTRACTION_CACHE_SIZE:
+            _seed_shard_file(config.EXTRACTION_CACHE_FILE or
+                             os.path.join(config.DOWNLOAD_PATH, ".kraken_extraction_cache.json"),
+                             shard_config.EXTRACTION_CACHE_FILE)
+        logger.info(f"crawling {name} with {len(courses)} courses")
+        kraken = engine(shard_config, resume=os.path.exists(shard_config.CHECKPOINT_FILE), courses=courses,
+                        cookie_file=queue.cookie_path)
+        kraken.run()
+        if kraken.checkpoint.exists():
+            # interrupted or failed, the shard stays claimed and continues with --resume
+            return
+        queue.complete(name)
+        crawled = True
+        idle_since = time.monotonic()
 
 
 if __name__ == '__main__':
-    config = Config()
-    kraken = Kraken(config)
-    kraken.run()
+    parser = argparse.ArgumentParser(description="scrapes lecture material from the eLearning system of the THWS")
+    parser.add_argument("--config", default="", help="path to a json config file")
+    parser.add_argument("--resume", action="store_true", help="continue the crawl from the last checkpoint")
+    parser.add_argument("--shards", type=int, default=0, help="split the courses into this many shards")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="local processes that crawl the shards, defaults to one per shard")
+    parser.add_argument("--work-queue", default="",
+                        help="shard queue directory, without --shards crawl shards of this queue as a worker node,"
+                             " waits up to shardStallTimeout for shards")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    if args.work_queue:
+        config.SHARD_QUEUE = args.work_queue
+    if args.shards:
+        run_sharded(config, args.shards, args.shards if args.workers is None else args.workers, resume=args.resume)
+    elif args.work_queue:
+        run_shard_worker(config, args.work_queue, idle_timeout=config.SHARD_STALL_TIMEOUT)
+    else:
+        engine = AsyncKraken if config.ENGINE == "asyncio" else Kraken
+        kraken = engine(config, resume=args.resume)
+        kraken.run()
 
 # TODO: - stop filtering /url/ links (see blockchain course as they link videos as this)
 #       - more or less filter by looking at further link and stay in the domain